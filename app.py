@@ -1,20 +1,96 @@
+import asyncio
 import os
 from app_utils import load_dotenv
-from chatlas import ChatGoogle
+from chatlas import Turn
 from shiny import App, ui, render, reactive
-import pandas as pd
-from pathlib import Path
 import faicons as fa
-import re
-import plotly.express as px
-import plotly.graph_objects as go
 from shinywidgets import output_widget, render_widget
 
-# Data directory
-here = Path(__file__).parent
-tips = pd.read_csv(here / "tips.csv")
-tips["percent"] = tips.tip / tips.total_bill
-df = pd.DataFrame(tips)
+import llm
+from commands import Command, CommandDetector, CommandParser, plot_params
+from filters import FilterError, apply_filter
+from history import HistoryManager
+from intents import IntentRouter
+from llm_cache import ResponseCache, cache_key
+from plots import MAX_POINTS, build_figure, figure_signature, update_figure_widget
+from shared import dataset, engine
+from sql import SqlError, markdown_table, retry_prompt
+from summary import METRICS, summarize
+from table import PAGE_SIZE, table_page
+
+load_dotenv()
+
+MODEL = "gemini-2.0-flash"
+SYSTEM_PROMPT = """
+You are a helpful assistant that can control a user interface and create data visualizations.
+Based on the user's request, you can show/hide UI elements and create plots.
+
+**UI Control Commands:**
+- To show the data table: 'show data table'
+- To hide the data table: 'hide data table'
+- To show the total number of tippers: 'show total tippers'
+- To hide the total number of tippers: 'hide total tippers'
+- To show the total bill: 'show total bill'
+- To hide the total bill: 'hide total bill'
+- To show the average tip percentage: 'show average tip percentage'
+- To hide the average tip percentage: 'hide average tip percentage'
+- To show the average bill: 'show average bill'
+- To hide the average bill: 'hide average bill'
+- To show everything: 'show everything'
+- To hide everything: 'hide everything'
+- To hide specific elements: 'hide elements: [element1], [element2], ...'
+
+**Filtering Commands:**
+- To filter the data: 'filter: [column][operator][value]' (e.g., 'filter: sex=Male and smoker=Yes')
+- Supported operators: =, !=, >, <, >=, <=, ~
+- Combine conditions with and, or, not and parentheses (e.g., 'filter: (day=Sat or day=Sun) and not smoker=Yes')
+- Set and range tests: 'filter: day in (Sat, Sun)', 'filter: total_bill between 10 and 20'
+- To clear filters: 'clear filters'
+- For filters the command language cannot express, use a DuckDB SQL query over the table `tips` that returns every column, on one line:
+  'sql filter: [query]' (e.g., 'sql filter: SELECT * FROM tips WHERE tip > (SELECT AVG(tip) FROM tips)')
+
+**Questions about the data:**
+- To answer a question with a DuckDB SQL query over the table `tips`, on one line: 'sql query: [query]'
+  (e.g., 'sql query: SELECT day, AVG(tip) AS average_tip FROM tips GROUP BY day'); the result is shown to the user
+- Queries are limited in run time, cost and result rows; a failed query is reported back to you as a JSON error, so aggregate or filter more and try again
+
+**Plot Commands:**
+- Histogram: 'plot histogram: [column]' (e.g., 'plot histogram: total_bill')
+- Bar chart: 'plot bar: [column]' (e.g., 'plot bar: day')
+- Scatter plot: 'plot scatter: [x_column] vs [y_column]' (e.g., 'plot scatter: total_bill vs tip')
+- Box plot: 'plot box: [column] by [group_column]' (e.g., 'plot box: total_bill by day')
+- Line plot: 'plot line: [x_column] vs [y_column]' (e.g., 'plot line: size vs tip')
+- Violin plot: 'plot violin: [column] by [group_column]' (e.g., 'plot violin: tip by smoker')
+- Heatmap: 'plot heatmap: [value_column] by [x_column] and [y_column]' (e.g., 'plot heatmap: tip by day and time')
+  The value is averaged; prefix it with sum, count, min, max or std for another aggregation (e.g., 'plot heatmap: sum of tip by day and time')
+- To hide plots: 'hide plot'
+
+Available columns: total_bill, tip, sex, smoker, day, time, size, percent
+
+When users ask for visualizations, suggest appropriate plot types and variables based on their request.
+"""
+
+# Complete replies shared across sessions; set LLM_CACHE_PATH to persist them
+response_cache = ResponseCache(
+    ttl=float(os.environ.get("LLM_CACHE_TTL", 3600)),
+    path=os.environ.get("LLM_CACHE_PATH"),
+)
+
+# Scatter and line plots above this many points are downsampled before rendering
+PLOT_MAX_POINTS = int(os.environ.get("PLOT_MAX_POINTS", MAX_POINTS))
+
+# Times a reply's failed SQL commands are sent back to the model to be rewritten
+SQL_MAX_RETRIES = int(os.environ.get("SQL_MAX_RETRIES", 1))
+
+# UI elements that show/hide commands can refer to, by the name used in the command
+ELEMENTS = {"data table": "data_table", **{key.replace("_", " "): key for key in METRICS}}
+command_parser = CommandParser(ELEMENTS)
+intent_router = IntentRouter(command_parser, dataset.columns)
+history_manager = HistoryManager(
+    command_parser,
+    max_tokens=int(os.environ.get("HISTORY_TOKEN_BUDGET", 3000)),
+    keep_turns=int(os.environ.get("HISTORY_KEEP_TURNS", 6)),
+)
 
 app_ui = ui.page_sidebar(
     ui.sidebar(
@@ -46,276 +122,218 @@ Available columns: total_bill, tip, sex, smoker, day, time, size, percent"""
 )
 
 def server(input, output, session):
-    load_dotenv()
-    chat_client = ChatGoogle(
-        api_key=os.environ.get("GOOGLE_API_KEY"),
-        system_prompt="""
-        You are a helpful assistant that can control a user interface and create data visualizations. 
-        Based on the user's request, you can show/hide UI elements and create plots.
-        
-        **UI Control Commands:**
-        - To show the data table: 'show data table'
-        - To hide the data table: 'hide data table'
-        - To show the total number of tippers: 'show total tippers'
-        - To hide the total number of tippers: 'hide total tippers'
-        - To show the total bill: 'show total bill'
-        - To hide the total bill: 'hide total bill'
-        - To show the average tip percentage: 'show average tip percentage'
-        - To hide the average tip percentage: 'hide average tip percentage'
-        - To show the average bill: 'show average bill'
-        - To hide the average bill: 'hide average bill'
-        - To show everything: 'show everything'
-        - To hide everything: 'hide everything'
-        - To hide specific elements: 'hide elements: [element1], [element2], ...'
-        
-        **Filtering Commands:**
-        - To filter the data: 'filter: [column][operator][value]' (e.g., 'filter: sex=Male and smoker=Yes')
-        - Supported operators: =, >, <, >=, <=, ~
-        - To clear filters: 'clear filters'
-        
-        **Plot Commands:**
-        - Histogram: 'plot histogram: [column]' (e.g., 'plot histogram: total_bill')
-        - Bar chart: 'plot bar: [column]' (e.g., 'plot bar: day')
-        - Scatter plot: 'plot scatter: [x_column] vs [y_column]' (e.g., 'plot scatter: total_bill vs tip')
-        - Box plot: 'plot box: [column] by [group_column]' (e.g., 'plot box: total_bill by day')
-        - Line plot: 'plot line: [x_column] vs [y_column]' (e.g., 'plot line: size vs tip')
-        - Violin plot: 'plot violin: [column] by [group_column]' (e.g., 'plot violin: tip by smoker')
-        - Heatmap: 'plot heatmap: [value_column] by [x_column] and [y_column]' (e.g., 'plot heatmap: tip by day and time')
-        - To hide plots: 'hide plot'
-        
-        Available columns: total_bill, tip, sex, smoker, day, time, size, percent
-        
-        When users ask for visualizations, suggest appropriate plot types and variables based on their request.
-        """,
-        model="gemini-2.0-flash",
-    )
+    # Per-session history over the process-wide pooled Gemini client
+    chat_client = llm.new_chat(SYSTEM_PROMPT, MODEL)
 
     chat = ui.Chat(id="chat")
-    reactive_df = reactive.Value(df)
+    # This session's cursor on the process-wide DuckDB database
+    sql_session = engine.session()
+    session.on_ended(sql_session.close)
+    # SQL commands of the reply being streamed that were rejected or failed
+    sql_errors: list[SqlError] = []
+    # Outcomes of SQL commands that were run ahead of the reactive lock
+    sql_outcomes: dict[Command, object] = {}
+    # Row selection over the shared dataset; None means no filter is applied
+    row_mask = reactive.Value(None)
     active_ui_elements = reactive.Value(set())
-    current_plot = reactive.Value(None)
     current_plot_config = reactive.Value(None)  # Store plot configuration for updates
+    # Config and trace types of the rendered widget; the widget is only re-created when
+    # this changes, other updates are applied to it in place
+    plot_shape = reactive.Value(None)
 
     @chat.on_user_submit
     async def handle_user_input(user_input: str):
-        response_stream = await chat_client.stream_async(user_input)
-        full_response = ""
-        async for chunk in response_stream:
-            full_response += chunk
-        
-        await chat.append_message(full_response)
-        await process_commands(full_response.lower())
-
-    async def process_commands(response_lower: str):
-        value_box_details = {
-            "total_tippers": {"title": "Total tippers", "icon": "user"},
-            "total_bill": {"title": "Total bill", "icon": "dollar-sign"},
-            "average_tip_percentage": {"title": "Average tip percentage", "icon": "percent"},
-            "average_bill": {"title": "Average bill", "icon": "dollar-sign"},
-        }
-
-        commands = {
-            "show data table": lambda: add_element("data_table", get_ui_element("data_table")),
-            "hide data table": lambda: remove_element("data_table"),
-            **{f"show {key.replace('_', ' ')}": lambda key=key: add_element(key, get_ui_element("value_box", title=value_box_details[key]["title"], output_id=key, icon_name=value_box_details[key]["icon"])) for key in value_box_details},
-            **{f"hide {key.replace('_', ' ')}": lambda key=key: remove_element(key) for key in value_box_details},
-        }
-
-        # Handle show/hide everything
-        if "show everything" in response_lower:
-            for cmd_key in value_box_details.keys():
-                commands[f"show {cmd_key.replace('_', ' ')}"]()
-            commands["show data table"]()
+        # Inputs that already are commands run locally, without a model round trip
+        command_text = intent_router.route(user_input)
+        if command_text:
+            await chat.append_message(command_text)
+            await process_commands(command_text)
+            # Keep the model's view of the conversation complete
+            chat_client.add_turn(Turn("user", user_input))
+            chat_client.add_turn(Turn("assistant", command_text))
             return
 
-        if "hide everything" in response_lower:
-            for element_id in list(active_ui_elements()):
-                remove_element(element_id)
-            return
-
-        # Handle hide specific elements
-        if "hide elements:" in response_lower:
-            elements_to_hide_str = response_lower.split("hide elements:")[1].strip()
-            elements_to_hide = [e.strip() for e in elements_to_hide_str.split(',')]
-            
-            element_name_to_id = {
-                "data table": "data_table",
-                **{key.replace('_', ' '): key for key in value_box_details.keys()}
-            }
-
-            for element_name in elements_to_hide:
-                element_id = element_name_to_id.get(element_name)
-                if element_id:
-                    remove_element(element_id)
-            return
+        # Fold older turns into a summary so each request stays within the token budget
+        trimmed = history_manager.trim(chat_client.get_turns())
+        if trimmed is not None:
+            chat_client.set_turns(trimmed)
+
+        history = [(turn.role, turn.text) for turn in chat_client.get_turns()]
+        key = cache_key(user_input, SYSTEM_PROMPT, MODEL, dataset.version, history)
+
+        def remember_reply(response: str):
+            # Replayed replies never went through chat_client, so record the turn
+            chat_client.add_turn(Turn("user", user_input))
+            chat_client.add_turn(Turn("assistant", response))
+
+        response_stream = response_cache.stream(
+            key, lambda: llm.stream_async(chat_client, user_input), on_replay=remember_reply
+        )
+        # Streams in the background so the dashboard can update mid-response
+        await chat.append_message_stream(stream_with_commands(response_stream))
+
+    async def stream_with_commands(response_stream, retries: int = SQL_MAX_RETRIES):
+        """Relay chunks to the chat, running each command as soon as its line is complete"""
+        detector = CommandDetector(command_parser)
+        sql_errors.clear()
+        async for chunk in response_stream:
+            yield chunk
+            for line in detector.feed(chunk):
+                await run_streamed_commands(line)
+        for line in detector.flush():
+            await run_streamed_commands(line)
+
+        if sql_errors and retries > 0:
+            # Report the failures to the model and stream its corrected commands into the
+            # same message
+            feedback = retry_prompt(sql_errors)
+            yield "\n\n"
+            async for chunk in stream_with_commands(await llm.stream_async(chat_client, feedback), retries - 1):
+                yield chunk
+
+    async def run_streamed_commands(line: str):
+        # The stream runs outside the reactive flush, so take the lock, allow reactive
+        # reads, and flush ourselves to push the resulting outputs to the browser. SQL
+        # can run for seconds, so it runs first, without holding every session's lock.
+        for command in command_parser.parse(line):
+            if command.kind in ("sql_filter", "sql_query"):
+                sql_outcomes[command] = await run_sql(command)
+        async with reactive.lock():
+            with reactive.isolate():
+                await process_commands(line)
+            await reactive.flush()
+
+    async def process_commands(response: str):
+        # Every command in the response runs, in the order it was written
+        for command in command_parser.parse(response):
+            await command_handlers[command.kind](command)
+
+    async def show_element(command: Command):
+        element_id = command.target
+        if element_id == "data_table":
+            add_element(element_id, get_ui_element("data_table"))
+        else:
+            metric = METRICS[element_id]
+            add_element(element_id, get_ui_element("value_box", title=metric.title, output_id=element_id, icon_name=metric.icon))
 
-        # Handle plotting commands
-        if "plot histogram:" in response_lower:
-            column = response_lower.split("plot histogram:")[1].strip()
-            await create_plot("histogram", x=column)
-            return
+    async def hide_element(command: Command):
+        remove_element(command.target)
 
-        if "plot bar:" in response_lower:
-            column = response_lower.split("plot bar:")[1].strip()
-            await create_plot("bar", x=column)
-            return
+    async def show_everything(command: Command):
+        for element_id in ELEMENTS.values():
+            await show_element(Command("show", element_id))
 
-        if "plot scatter:" in response_lower:
-            vars_str = response_lower.split("plot scatter:")[1].strip()
-            if " vs " in vars_str:
-                x_col, y_col = [v.strip() for v in vars_str.split(" vs ")]
-                await create_plot("scatter", x=x_col, y=y_col)
-            return
+    async def hide_everything(command: Command):
+        for element_id in list(active_ui_elements()):
+            remove_element(element_id)
 
-        if "plot box:" in response_lower:
-            vars_str = response_lower.split("plot box:")[1].strip()
-            if " by " in vars_str:
-                y_col, x_col = [v.strip() for v in vars_str.split(" by ")]
-                await create_plot("box", x=x_col, y=y_col)
-            return
+    async def hide_elements(command: Command):
+        for element_name in command.argument.split(","):
+            element_id = ELEMENTS.get(element_name.strip())
+            if element_id:
+                remove_element(element_id)
 
-        if "plot line:" in response_lower:
-            vars_str = response_lower.split("plot line:")[1].strip()
-            if " vs " in vars_str:
-                x_col, y_col = [v.strip() for v in vars_str.split(" vs ")]
-                await create_plot("line", x=x_col, y=y_col)
-            return
+    async def plot(command: Command):
+        params = plot_params(command.target, command.argument)
+        if params:
+            await create_plot(command.target, **params)
 
-        if "plot violin:" in response_lower:
-            vars_str = response_lower.split("plot violin:")[1].strip()
-            if " by " in vars_str:
-                y_col, x_col = [v.strip() for v in vars_str.split(" by ")]
-                await create_plot("violin", x=x_col, y=y_col)
-            return
+    async def hide_plot(command: Command):
+        remove_element("plot")
 
-        if "plot heatmap:" in response_lower:
-            vars_str = response_lower.split("plot heatmap:")[1].strip()
-            if " by " in vars_str and " and " in vars_str:
-                parts = vars_str.split(" by ", 1)[1]
-                if " and " in parts:
-                    value_col = vars_str.split(" by ")[0].strip()
-                    x_col, y_col = [v.strip() for v in parts.split(" and ")]
-                    await create_plot("heatmap", x=x_col, y=y_col, z=value_col)
+    async def apply_filter_command(command: Command):
+        filter_str_raw = command.argument
+        try:
+            # Compiled once and cached process-wide by normalized text and dataset version
+            mask = apply_filter(filter_str_raw, dataset)
+        except FilterError as e:
+            await chat.append_message(str(e))
             return
-
-        if "hide plot" in response_lower:
-            remove_element("plot")
+        except Exception as e:
+            await chat.append_message(f"Error during filtering '{filter_str_raw}': {e}")
             return
 
-        # Handle filtering
-        if "filter:" in response_lower:
-            filter_str_raw = response_lower.split("filter:")[1].strip()
-            filter_conditions = [cond.strip() for cond in filter_str_raw.split(" and ")]
-            
-            current_filtered_df = df.copy()
-
-            for filter_condition in filter_conditions:
-                try:
-                    match = re.match(r"([a-zA-Z_]+)([<>=~]+)(.*)", filter_condition)
-                    if not match:
-                        await chat.append_message(f"Invalid filter command format for '{filter_condition}'.")
-                        return
-
-                    column, operator, value = match.groups()
-                    column = column.strip()
-                    value = value.strip()
-
-                    if column not in current_filtered_df.columns:
-                        await chat.append_message(f"Column '{column}' not found.")
-                        return
-
-                    if operator == "=":
-                        if pd.api.types.is_numeric_dtype(current_filtered_df[column]):
-                            current_filtered_df = current_filtered_df[current_filtered_df[column] == float(value)]
-                        else:
-                            current_filtered_df = current_filtered_df[current_filtered_df[column].astype(str).str.lower() == value.lower()]
-                    elif operator == ">":
-                        current_filtered_df = current_filtered_df[current_filtered_df[column] > float(value)]
-                    elif operator == "<":
-                        current_filtered_df = current_filtered_df[current_filtered_df[column] < float(value)]
-                    elif operator == ">=":
-                        current_filtered_df = current_filtered_df[current_filtered_df[column] >= float(value)]
-                    elif operator == "<=":
-                        current_filtered_df = current_filtered_df[current_filtered_df[column] <= float(value)]
-                    elif operator == "~":
-                        current_filtered_df = current_filtered_df[current_filtered_df[column].astype(str).str.lower().str.contains(value.lower())]
-
-                except ValueError:
-                    await chat.append_message(f"Invalid value for filtering in '{filter_condition}'.")
-                    return
-                except Exception as e:
-                    await chat.append_message(f"Error during filtering '{filter_condition}': {e}")
-                    return
-            
-            reactive_df.set(current_filtered_df)
-            await chat.append_message(f"Filtered data by '{filter_str_raw}'. Showing {len(current_filtered_df)} rows.")
-            return
+        row_mask.set(mask)
+        await chat.append_message(f"Filtered data by '{filter_str_raw}'. Showing {dataset.count(mask)} rows.")
 
-        if "clear filters" in response_lower:
-            reactive_df.set(df)
-            await chat.append_message("Filters cleared. Showing all data.")
+    async def run_sql(command: Command):
+        """The result of a SQL command, or the `SqlError` it raised"""
+        if command in sql_outcomes:
+            return sql_outcomes.pop(command)
+        run = sql_session.filter_mask if command.kind == "sql_filter" else sql_session.query
+        try:
+            # In a worker thread under the engine's limits, so a slow query neither
+            # blocks other sessions nor outlives its deadline
+            return await asyncio.to_thread(run, command.argument)
+        except SqlError as e:
+            return e
+
+    async def apply_sql_filter(command: Command):
+        mask = await run_sql(command)
+        if isinstance(mask, SqlError):
+            sql_errors.append(mask)
+            await chat.append_message(str(mask))
             return
 
-        # Execute other commands
-        for command, action in commands.items():
-            if command in response_lower:
-                action()
+        row_mask.set(mask)
+        await chat.append_message(f"Filtered data by SQL query. Showing {dataset.count(mask)} rows.")
 
-    async def create_plot(plot_type: str, x: str = None, y: str = None, z: str = None):
-        data = reactive_df()
-        
-        if data.empty:
+    async def run_sql_query(command: Command):
+        result = await run_sql(command)
+        if isinstance(result, SqlError):
+            sql_errors.append(result)
+            await chat.append_message(str(result))
+            return
+        await chat.append_message(f"```sql\n{command.argument}\n```\n\n{markdown_table(result)}")
+
+    async def clear_filters(command: Command):
+        row_mask.set(None)
+        await chat.append_message("Filters cleared. Showing all data.")
+
+    command_handlers = {
+        "show": show_element,
+        "hide": hide_element,
+        "show_all": show_everything,
+        "hide_all": hide_everything,
+        "hide_elements": hide_elements,
+        "plot": plot,
+        "hide_plot": hide_plot,
+        "filter": apply_filter_command,
+        "sql_filter": apply_sql_filter,
+        "sql_query": run_sql_query,
+        "clear_filters": clear_filters,
+    }
+
+    async def create_plot(plot_type: str, x: str = None, y: str = None, z: str = None, agg: str = None):
+        mask = row_mask()
+
+        if dataset.count(mask) == 0:
             await chat.append_message("No data available for plotting.")
             return
         
         # Validate columns
-        available_cols = data.columns.tolist()
+        available_cols = dataset.columns
         for col in [x, y, z]:
             if col and col not in available_cols:
                 await chat.append_message(f"Column '{col}' not found. Available columns: {', '.join(available_cols)}")
                 return
 
         # Store plot configuration for reactive updates
-        plot_config = {"type": plot_type, "x": x, "y": y, "z": z}
+        plot_config = {"type": plot_type, "x": x, "y": y, "z": z, "agg": agg}
         current_plot_config.set(plot_config)
+        if "plot" not in active_ui_elements():
+            # A re-inserted output needs a fresh widget even if its shape is unchanged
+            plot_shape.set(None)
 
         try:
-            fig = create_plot_figure(data, plot_config)
-            current_plot.set(fig)
+            # Memoized, so rendering the widget reuses this figure
+            build_figure(dataset, mask, plot_config, PLOT_MAX_POINTS)
             add_element("plot", get_ui_element("plot"))
             await chat.append_message(f"Created {plot_type} plot successfully!")
             
         except Exception as e:
             await chat.append_message(f"Error creating plot: {e}")
 
-    def create_plot_figure(data, plot_config):
-        """Helper function to create plot figure from data and config"""
-        plot_type = plot_config["type"]
-        x = plot_config["x"]
-        y = plot_config["y"] 
-        z = plot_config["z"]
-        
-        if plot_type == "histogram" and x:
-            return px.histogram(data, x=x, title=f"Histogram of {x}")
-        elif plot_type == "bar" and x:
-            value_counts = data[x].value_counts()
-            return px.bar(x=value_counts.index, y=value_counts.values, 
-                       labels={'x': x, 'y': 'Count'}, title=f"Bar Chart of {x}")
-        elif plot_type == "scatter" and x and y:
-            return px.scatter(data, x=x, y=y, title=f"Scatter Plot: {x} vs {y}")
-        elif plot_type == "box" and x and y:
-            return px.box(data, x=x, y=y, title=f"Box Plot: {y} by {x}")
-        elif plot_type == "line" and x and y:
-            return px.line(data, x=x, y=y, title=f"Line Plot: {x} vs {y}")
-        elif plot_type == "violin" and x and y:
-            return px.violin(data, x=x, y=y, title=f"Violin Plot: {y} by {x}")
-        elif plot_type == "heatmap" and x and y and z:
-            # Create pivot table for heatmap
-            pivot_data = data.groupby([x, y])[z].mean().unstack(fill_value=0)
-            return px.imshow(pivot_data, title=f"Heatmap: {z} by {x} and {y}")
-        else:
-            raise ValueError(f"Invalid plot configuration for {plot_type}.")
-
     def add_element(element_id: str, ui_element):
         if element_id not in active_ui_elements():
             ui.insert_ui(selector="#dynamic_ui_container", where="beforeEnd", ui=ui_element)
@@ -328,7 +346,18 @@ def server(input, output, session):
 
     def get_ui_element(element_type: str, **kwargs):
         if element_type == "data_table":
-            return ui.div(ui.h2("Data Table"), ui.output_data_frame("data_table"), id="data_table_wrapper")
+            return ui.div(
+                ui.h2("Data Table"),
+                ui.layout_columns(
+                    ui.input_select("table_sort", "Sort by", choices=["", *dataset.columns]),
+                    ui.input_checkbox("table_descending", "Descending"),
+                    ui.input_text("table_filter", "Filter rows", placeholder="e.g. tip > 5"),
+                    ui.input_numeric("table_page", "Page", value=1, min=1),
+                ),
+                ui.output_text("table_info"),
+                ui.output_data_frame("data_table"),
+                id="data_table_wrapper",
+            )
         elif element_type == "value_box":
             output_id = kwargs.get("output_id") or ""
             icon_name = kwargs.get("icon_name") or ""
@@ -343,38 +372,89 @@ def server(input, output, session):
         elif element_type == "plot":
             return ui.div(ui.h2("Visualization"), output_widget("plot_output"), id="plot_wrapper")
 
+    @reactive.calc
+    def table_mask():
+        # The table's own filter, in the filter command language, narrows the session's
+        mask = row_mask()
+        text = input.table_filter().strip()
+        if not text:
+            return mask
+        table_filter = apply_filter(text, dataset)
+        return table_filter if mask is None else mask & table_filter
+
+    @reactive.calc
+    def current_table_page():
+        # Sorted, filtered and paged on the server; only the visible rows are sent
+        return table_page(
+            dataset,
+            table_mask(),
+            page=input.table_page() or 1,
+            sort=input.table_sort() or None,
+            descending=input.table_descending(),
+        )
+
     # Render functions
     @render.data_frame
     def data_table():
-        return reactive_df()
-
-    @render.text
-    def total_tippers():
-        return str(len(reactive_df()))
-
-    @render.text
-    def total_bill():
-        return f"${reactive_df()['total_bill'].sum():,.2f}"
-
-    @render.text
-    def average_tip_percentage():
-        return f"{reactive_df()['percent'].mean():.2%}"
+        try:
+            return current_table_page().frame
+        except FilterError:
+            return dataset.frame.iloc[:0]
 
     @render.text
-    def average_bill():
-        return f"${reactive_df()['total_bill'].mean():,.2f}"
+    def table_info():
+        try:
+            page = current_table_page()
+        except FilterError as e:
+            return str(e)
+        if not page.total:
+            return "No matching rows."
+        last = page.offset + len(page.frame)
+        return f"Rows {page.offset + 1:,}-{last:,} of {page.total:,} (page {page.offset // PAGE_SIZE + 1} of {page.n_pages})"
+
+    @reactive.calc
+    def summary():
+        # One pass over the filtered rows feeds every value box
+        return summarize(dataset, row_mask())
+
+    def register_value_box(key: str):
+        @output(id=key)
+        @render.text
+        def _():
+            return METRICS[key].format(summary()[key])
+
+    for key in METRICS:
+        register_value_box(key)
+
+    @reactive.effect
+    def sync_plot():
+        # Follows the data and plot config; same-shaped figures are patched into the
+        # rendered widget, anything else re-renders it
+        mask = row_mask()
+        config = current_plot_config()
+        if not config or not dataset.count(mask):
+            return
+        try:
+            fig = build_figure(dataset, mask, config, PLOT_MAX_POINTS)
+        except Exception:
+            return
+        shape = (config, figure_signature(fig))
+        with reactive.isolate():
+            if shape != plot_shape():
+                plot_shape.set(shape)
+                return
+            widget = plot_output.widget
+        if widget is None or not update_figure_widget(widget, fig):
+            plot_shape.set(None)
+            plot_shape.set(shape)
 
     @render_widget
     def plot_output():
-        # Reactive plot that updates when data or plot config changes
-        data = reactive_df()
-        config = current_plot_config()
-        
-        if config and not data.empty:
-            try:
-                return create_plot_figure(data, config)
-            except:
-                return None
-        return current_plot()
+        shape = plot_shape()
+        if shape is None:
+            return None
+        with reactive.isolate():
+            mask = row_mask()
+        return build_figure(dataset, mask, shape[0], PLOT_MAX_POINTS)
 
 app = App(app_ui, server)
\ No newline at end of file
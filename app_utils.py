@@ -24,3 +24,24 @@ def load_dotenv(dotenv_path: os.PathLike[str] = env_file, **kwargs: Any) -> None
             "`pip install python-dotenv`.",
             stacklevel=2,
         )
+
+
+def llm_backend() -> str:
+    """
+    The chat backend selected by the `LLM_BACKEND` environment variable: "google" (the
+    default) talks to Gemini, "mock" uses the offline `mock_llm.MockChat`.
+    """
+    return os.environ.get("LLM_BACKEND", "google").strip().lower()
+
+
+def mock_llm_options() -> dict[str, Any]:
+    """
+    Settings of the mock backend, from `MOCK_LLM_TTFT` and `MOCK_LLM_CHUNK_DELAY` (seconds),
+    `MOCK_LLM_CHUNK_SIZE` (characters) and `MOCK_LLM_SCRIPT` (a JSON file of scripted replies).
+    """
+    return {
+        "ttft": float(os.environ.get("MOCK_LLM_TTFT", 0.3)),
+        "chunk_delay": float(os.environ.get("MOCK_LLM_CHUNK_DELAY", 0.02)),
+        "chunk_size": int(os.environ.get("MOCK_LLM_CHUNK_SIZE", 8)),
+        "script_path": os.environ.get("MOCK_LLM_SCRIPT") or None,
+    }
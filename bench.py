@@ -0,0 +1,192 @@
+"""
+Microbenchmarks of the dashboard's hot paths across dataset sizes.
+
+Times CSV parsing against the columnar cache, dataset loading (index build), filtering,
+DuckDB queries, the value-box summary, data table pages, every plot type (figure
+construction and JSON serialization) and `query.df_to_schema` on synthetic data from
+`synth.py`, and writes the results as JSON. Two result files can be compared.
+
+    python bench.py --sizes 10000 1000000 --out before.json
+    python bench.py --compare before.json after.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+import query
+import synth
+from columnar import read_csv_cached
+from dataset import Dataset
+from filters import compile_filter
+from bins import bin_cache
+from distributions import distribution_cache
+from pivot import pivot_cache
+from plots import build_figure, figure_cache
+from sql import SqlEngine, sql_cache
+from summary import summarize
+from table import row_cache, table_page
+
+here = Path(__file__).parent
+
+FILTERS = [
+    "sex=male and smoker=yes",
+    "day in (sat, sun) or time=lunch",
+    "total_bill>40",
+    "tip between 2 and 3 and size>=4",
+    "not (day=thur) and percent<0.1",
+]
+PLOTS = [
+    {"type": "histogram", "x": "total_bill", "y": None, "z": None},
+    {"type": "bar", "x": "day", "y": None, "z": None},
+    {"type": "scatter", "x": "total_bill", "y": "tip", "z": None},
+    {"type": "line", "x": "size", "y": "tip", "z": None},
+    {"type": "box", "x": "day", "y": "total_bill", "z": None},
+    {"type": "violin", "x": "smoker", "y": "tip", "z": None},
+    {"type": "heatmap", "x": "day", "y": "time", "z": "tip"},
+]
+SQL_QUERIES = [
+    "SELECT * FROM tips WHERE sex = 'Male' AND smoker = 'Yes'",
+    "SELECT day, time, AVG(tip) AS tip, COUNT(*) AS n FROM tips GROUP BY day, time",
+    "SELECT * FROM tips WHERE total_bill > (SELECT quantile_cont(total_bill, 0.9) FROM tips)",
+]
+# Plots that ship every row to the browser get slow quickly; skip them above this size
+PLOT_MAX_ROWS = 2_000_000
+
+
+def timeit(func: Callable[[], object], repeats: int) -> dict:
+    times = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(times), "min_s": min(times), "repeats": repeats, "result": result}
+
+
+def bench_size(n_rows: int, repeats: int, seed: int) -> list[dict]:
+    frame = synth.generate_tips(n_rows, seed, with_percent=True)
+    results = []
+
+    def record(name: str, func: Callable[[], object], **extra):
+        stats = timeit(func, repeats)
+        stats.pop("result")
+        results.append({"bench": name, "rows": n_rows, **stats, **extra})
+        print(f"{name:<32} {n_rows:>10,} rows {stats['median_s'] * 1000:10.2f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "tips.csv"
+        frame.to_csv(source, index=False)
+        record("csv_parse", lambda: pd.read_csv(source), repeats=1)
+        read_csv_cached(source, cache_dir=tmp)
+        record("columnar_load", lambda: read_csv_cached(source, cache_dir=tmp))
+
+    record("dataset_load", lambda: Dataset(frame, range_indexes=["total_bill", "tip", "percent"]), repeats=1)
+    dataset = Dataset(frame, range_indexes=["total_bill", "tip", "percent"])
+
+    masks = {}
+    for text in FILTERS:
+        compiled = compile_filter(text)
+        masks[text] = compiled(dataset)
+        record(f"filter[{text}]", lambda: uncached(compiled, dataset), selected=int(masks[text].sum()))
+
+    engine = SqlEngine(dataset)
+    sql_session = engine.session()
+    for sql in SQL_QUERIES:
+        record(f"sql[{sql}]", lambda: uncached(sql_session.arrow, sql, n_rows))
+
+    mask = masks[FILTERS[0]]
+    record("summary[unfiltered]", lambda: summarize(dataset, None))
+    record("summary[filtered]", lambda: summarize(dataset, mask))
+    record("materialize[filtered]", lambda: dataset.take(mask))
+    record("table_page[filtered]", lambda: uncached(table_page, dataset, mask, 2))
+    record("table_page[sorted]", lambda: uncached(table_page, dataset, mask, 2, "tip", True))
+
+    if n_rows <= PLOT_MAX_ROWS:
+        for config in PLOTS:
+            fig = build_figure(dataset, None, config)
+            payload = len(fig.to_json())
+            record(f"plot_build[{config['type']}]", lambda: uncached(build_figure, dataset, None, config))
+            record(f"plot_json[{config['type']}]", lambda: fig.to_json(), payload_bytes=payload)
+
+    record("df_to_schema", lambda: query.df_to_schema(frame, "tips", 10))
+    record("df_to_schema[dataset]", lambda: query.df_to_schema(dataset, "tips", 10))
+    record("system_prompt[cached]", lambda: query.system_prompt(dataset, "tips"))
+    return results
+
+
+def uncached(func: Callable, *args):
+    # Time the computation rather than a lookup in the shared per-selection caches or
+    # in the bitmaps the indexes keep
+    for arg in args:
+        if isinstance(arg, Dataset):
+            arg.clear_index_caches()
+    bin_cache.clear()
+    distribution_cache.clear()
+    pivot_cache.clear()
+    figure_cache.clear()
+    row_cache.clear()
+    sql_cache.clear()
+    return func(*args)
+
+
+def metadata() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=here, capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(before_path: Path, after_path: Path):
+    before = {(r["bench"], r["rows"]): r for r in json.loads(before_path.read_text())["results"]}
+    after = {(r["bench"], r["rows"]): r for r in json.loads(after_path.read_text())["results"]}
+    print(f"{'bench':<32} {'rows':>10} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for key in sorted(before.keys() & after.keys(), key=lambda k: (k[1], k[0])):
+        old, new = before[key]["median_s"], after[key]["median_s"]
+        speedup = old / new if new else float("inf")
+        print(f"{key[0]:<32} {key[1]:>10,} {old * 1000:10.2f} {new * 1000:10.2f} {speedup:7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--compare", type=Path, nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = []
+    for n_rows in args.sizes:
+        results += bench_size(n_rows, args.repeats, args.seed)
+    args.out.write_text(json.dumps({"meta": metadata(), "results": results}, indent=2))
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
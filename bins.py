@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import math
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from dataset import Dataset
+
+# Histograms get about sqrt(n) bins, within these bounds
+MIN_BINS = 10
+MAX_BINS = 100
+# Integer columns spanning at most this many values get one bin per value
+MAX_UNIT_BINS = 100
+
+BIN_CACHE_BYTES = 16 * 1024 * 1024
+bin_cache = LRUCache(BIN_CACHE_BYTES, size=lambda value: sum(array.nbytes for array in value))
+
+
+def histogram_counts(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Bin edges and counts of a numeric array, ignoring missing values.
+
+    Small integer ranges get one bin per integer; otherwise the range is split into
+    about sqrt(n) equal-width bins.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return np.array([0.0, 1.0]), np.zeros(1, dtype=np.int64)
+    low, high = values.min(), values.max()
+    if np.all(values == np.round(values)) and high - low < MAX_UNIT_BINS:
+        edges = np.arange(low - 0.5, high + 1.5)
+    else:
+        n_bins = min(MAX_BINS, max(MIN_BINS, math.ceil(math.sqrt(len(values)))))
+        edges = np.linspace(low, high, n_bins + 1) if high > low else np.array([low - 0.5, low + 0.5])
+    counts, _ = np.histogram(values, bins=edges)
+    return edges, counts
+
+
+def category_counts(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Distinct values and their counts, most frequent first (like `value_counts()`)."""
+    counts = pd.Series(values).value_counts()
+    return counts.index.to_numpy(), counts.to_numpy()
+
+
+def dataset_histogram(dataset: Dataset, mask: Optional[np.ndarray], column: str) -> tuple[np.ndarray, np.ndarray]:
+    """`histogram_counts` of a column over the selected rows, cached per selection."""
+    key = ("histogram", dataset.version, dataset.selection_key(mask), column)
+    values = dataset.column(column)
+    return bin_cache.get_or_compute(key, lambda: histogram_counts(values if mask is None else values[mask]))
+
+
+def dataset_category_counts(
+    dataset: Dataset, mask: Optional[np.ndarray], column: str
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    `category_counts` of a column over the selected rows, cached per selection.
+
+    Indexed columns are counted with one `bincount` over their codes.
+    """
+    key = ("categories", dataset.version, dataset.selection_key(mask), column)
+    return bin_cache.get_or_compute(key, lambda: _category_counts(dataset, mask, column))
+
+
+def _category_counts(dataset: Dataset, mask: Optional[np.ndarray], column: str) -> tuple[np.ndarray, np.ndarray]:
+    index = dataset.index(column)
+    if index is None:
+        values = dataset.column(column)
+        return category_counts(values if mask is None else values[mask])
+    codes = index.codes if mask is None else index.codes[mask]
+    # Missing values have code -1 and are left out, as value_counts() does
+    counts = np.bincount(codes[codes >= 0], minlength=len(index.labels))
+    order = np.argsort(-counts, kind="stable")
+    order = order[counts[order] > 0]
+    return index.labels[order], counts[order]
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+# Bump when the layout of cache files changes, so old ones are rebuilt
+CACHE_FORMAT = 1
+
+# Where converted files are kept unless DATA_CACHE_DIR says otherwise
+DEFAULT_CACHE_DIR = Path(__file__).parent / ".cache"
+
+
+def read_csv_cached(
+    path: os.PathLike[str],
+    derive: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+    cache_dir: Optional[os.PathLike[str]] = None,
+) -> pd.DataFrame:
+    """
+    A CSV file as a DataFrame, parsed once and then loaded from a columnar cache.
+
+    The first load parses the CSV, applies `derive` (e.g. to add computed columns) and
+    writes the typed result as an uncompressed Arrow IPC file. Later loads memory-map
+    that file instead: numeric columns are views of the mapped pages rather than
+    private copies, so worker processes on one machine share them through the page
+    cache. The file is named after the source (its path and `derive`) and then its
+    version (size and modification time), so editing the CSV or the derivation builds a
+    new one. Building one removes the files of earlier versions of the same source, and
+    only those: other CSVs and other derivations keep their files.
+    """
+    path = Path(path)
+    cache_dir = Path(cache_dir or os.environ.get("DATA_CACHE_DIR") or DEFAULT_CACHE_DIR)
+    prefix = f"{path.stem}.{_source_key(path, derive)}."
+    cached = cache_dir / f"{prefix}{cache_key(path, derive)}.arrow"
+    if not cached.exists():
+        frame = pd.read_csv(path)
+        if derive is not None:
+            frame = derive(frame)
+        _write(frame, cached)
+        for stale in cache_dir.iterdir():
+            if stale.name.startswith(prefix) and stale.suffix == ".arrow" and stale != cached:
+                stale.unlink(missing_ok=True)
+    return _read(cached)
+
+
+def cache_key(path: os.PathLike[str], derive: Optional[Callable] = None) -> str:
+    """
+    Identifies one version of a CSV file (and its derivation) without reading it.
+
+    It names the cache file, and doubles as the dataset version, so a warm start never
+    hashes the data.
+    """
+    path = Path(path)
+    stat = path.stat()
+    digest = hashlib.sha1()
+    for part in (CACHE_FORMAT, path.resolve(), stat.st_size, stat.st_mtime_ns, _qualname(derive)):
+        digest.update(str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def _source_key(path: Path, derive: Optional[Callable]) -> str:
+    # Which file a cache file was built from, and how, whatever its version
+    return hashlib.sha1(f"{path.resolve()}\0{_qualname(derive)}".encode()).hexdigest()[:8]
+
+
+def _qualname(func: Optional[Callable]) -> str:
+    if func is None:
+        return ""
+    return f"{getattr(func, '__module__', '')}.{getattr(func, '__qualname__', repr(func))}"
+
+
+def _write(frame: pd.DataFrame, cached: Path):
+    cached.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    # Written under a temporary name and renamed, so concurrent workers never see a
+    # partial file; whichever rename lands last wins with identical contents
+    fd, tmp = tempfile.mkstemp(dir=cached.parent, prefix=cached.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        # mkstemp creates the file private to us; workers running as other users need
+        # to map it too
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp, 0o666 & ~umask)
+        os.replace(tmp, cached)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _read(cached: Path) -> pd.DataFrame:
+    with pa.memory_map(str(cached), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    # One block per column keeps numeric columns zero-copy views of the mapping
+    return table.to_pandas(split_blocks=True)
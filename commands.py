@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import re
+from typing import NamedTuple, Optional
+
+PLOT_TYPES = ("histogram", "bar", "scatter", "box", "line", "violin", "heatmap")
+# Words a heatmap's value column may be prefixed with, e.g. "plot heatmap: sum of tip by day and time"
+HEATMAP_AGGREGATIONS = {
+    "mean": "mean", "average": "mean", "avg": "mean", "sum": "sum", "total": "sum", "count": "count",
+    "min": "min", "minimum": "min", "max": "max", "maximum": "max", "std": "std",
+}
+
+_TRAILING_JOIN_RE = re.compile(r"[\s,;.]*(?:\b(?:and|then|also)\b[\s,;.]*)*$", re.IGNORECASE)
+# Commands whose argument keeps its case (SQL string literals are case-sensitive)
+VERBATIM_KINDS = {"sql_filter", "sql_query"}
+
+
+class Command(NamedTuple):
+    """One command found in a model response, e.g. `Command("plot", "box", "total_bill by day")`."""
+
+    kind: str
+    target: Optional[str] = None
+    argument: str = ""
+
+
+class CommandParser:
+    """
+    Extracts every dashboard command from a response in a single pass.
+
+    All command phrases are compiled into one alternation, so a response is scanned
+    once regardless of how many command types exist. Commands ending in ":" take the
+    rest of their line (up to the next command) as their argument; SQL commands take
+    the whole rest of the line. `elements` maps the phrase used in show/hide commands
+    to the id of the UI element it controls.
+    """
+
+    def __init__(self, elements: dict[str, str]):
+        rules = [
+            ("show everything", "show_all", None),
+            ("hide everything", "hide_all", None),
+            ("hide elements:", "hide_elements", None),
+            ("hide plot", "hide_plot", None),
+            ("filter:", "filter", None),
+            ("sql filter:", "sql_filter", None),
+            ("sql query:", "sql_query", None),
+            ("clear filters", "clear_filters", None),
+        ]
+        rules += [(f"plot {plot_type}:", "plot", plot_type) for plot_type in PLOT_TYPES]
+        for phrase, element_id in elements.items():
+            rules += [(f"show {phrase}", "show", element_id), (f"hide {phrase}", "hide", element_id)]
+
+        self.rules = {phrase: (kind, target) for phrase, kind, target in rules}
+        # Longest phrases first so e.g. "hide elements:" wins over shorter prefixes
+        phrases = sorted(self.rules, key=len, reverse=True)
+        self.pattern = re.compile(r"(?<!\w)(?:" + "|".join(re.escape(p) for p in phrases) + ")", re.IGNORECASE)
+
+    def has_command(self, text: str) -> bool:
+        return self.pattern.search(text) is not None
+
+    def parse(self, text: str) -> list[Command]:
+        matches = list(self.pattern.finditer(text))
+        commands = []
+        verbatim_end = 0
+        for i, match in enumerate(matches):
+            if match.start() < verbatim_end:
+                # Inside a SQL argument, e.g. a string literal 'hide plot'
+                continue
+            kind, target = self.rules[match.group(0).lower()]
+            argument = ""
+            if match.group(0).endswith(":"):
+                end = text.find("\n", match.end())
+                end = len(text) if end == -1 else end
+                argument = text[match.end():end]
+                if kind in VERBATIM_KINDS:
+                    # SQL takes the rest of the line, whatever phrases it contains
+                    verbatim_end = end
+                elif i + 1 < len(matches) and matches[i + 1].start() < end:
+                    # Another command follows on the same line; drop the joining word
+                    argument = _TRAILING_JOIN_RE.sub("", text[match.end():matches[i + 1].start()])
+                argument = _clean(argument)
+                if kind not in VERBATIM_KINDS:
+                    argument = argument.lower()
+            commands.append(Command(kind, target, argument))
+        return commands
+
+
+def plot_params(plot_type: str, argument: str) -> Optional[dict]:
+    """The x/y/z columns (and heatmap aggregation) of a plot command's argument, or None if it is malformed."""
+    if plot_type in ("histogram", "bar"):
+        return {"x": argument} if argument else None
+    if plot_type in ("scatter", "line"):
+        parts = [v.strip() for v in argument.split(" vs ")]
+        return {"x": parts[0], "y": parts[1]} if len(parts) == 2 else None
+    if plot_type in ("box", "violin"):
+        parts = [v.strip() for v in argument.split(" by ")]
+        return {"x": parts[1], "y": parts[0]} if len(parts) == 2 else None
+    if plot_type == "heatmap" and " by " in argument:
+        value_col, parts = argument.split(" by ", 1)
+        parts = [v.strip() for v in parts.split(" and ")]
+        if len(parts) != 2:
+            return None
+        words = value_col.split()
+        agg = "mean"
+        if len(words) > 1 and words[0] in HEATMAP_AGGREGATIONS:
+            agg = HEATMAP_AGGREGATIONS[words.pop(0)]
+            if words[0] == "of" and len(words) > 1:
+                words.pop(0)
+        return {"x": parts[0], "y": parts[1], "z": " ".join(words), "agg": agg}
+    return None
+
+
+class CommandDetector:
+    """
+    Incrementally splits streamed model output into complete lines.
+
+    `feed()` takes each chunk as it arrives and returns the lines it completed that
+    contain a command, so they can be executed while the rest of the response is still
+    being generated. `flush()` returns the final, unterminated line once the stream ends.
+    """
+
+    def __init__(self, parser: CommandParser):
+        self.parser = parser
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> list[str]:
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split("\n")
+        return [line for line in lines if self.parser.has_command(line)]
+
+    def flush(self) -> list[str]:
+        line, self._buffer = self._buffer, ""
+        return [line] if self.parser.has_command(line) else []
+
+
+def _clean(argument: str) -> str:
+    argument = argument.strip().rstrip(".,;").strip()
+    # Drop a closing quote or backtick left over from the model quoting the command
+    while argument and argument[-1] in "`'\"" and argument.count(argument[-1]) % 2:
+        argument = argument[:-1].rstrip().rstrip(".,;")
+    return argument
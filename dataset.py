@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+from cache import LRUCache
+
+# Columns with at most this many distinct values get a bitmap index at load time
+INDEX_MAX_CARDINALITY = 64
+# Row bitmaps each index keeps built at most (one byte per row each)
+INDEX_CACHED_BITMAPS = 8
+
+
+class BitmapIndex:
+    """
+    Row bitmaps for the distinct values of a low-cardinality column.
+
+    The index stores the column's codes in the smallest integer type that holds them
+    (one byte per row up to 127 values) and builds a value's bitmap from them on first
+    use. The most recently used bitmaps are kept, up to `INDEX_CACHED_BITMAPS`, so memory
+    stays bounded whatever the cardinality. Keys are normalized the way filters compare
+    values: lowercased strings for text columns and floats for numeric ones. The codes
+    and bitmaps are shared and read-only.
+    """
+
+    def __init__(self, codes: np.ndarray, uniques: Iterable, numeric: bool):
+        self.labels = np.asarray(uniques)
+        self.codes = codes.astype(np.min_scalar_type(-len(self.labels)))
+        self.codes.flags.writeable = False
+        self.numeric = numeric
+        # Values that normalize to the same key (e.g. "Yes" and "yes") share it
+        self.key_codes: dict = {}
+        for code, value in enumerate(self.labels):
+            self.key_codes.setdefault(self.key(value), []).append(code)
+        self._bitmaps = LRUCache(INDEX_CACHED_BITMAPS * max(len(codes), 1))
+        self.empty = np.zeros(len(codes), dtype=bool)
+        self.empty.flags.writeable = False
+
+    def key(self, value):
+        return float(value) if self.numeric else str(value).lower()
+
+    def eq(self, key) -> np.ndarray:
+        codes = self.key_codes.get(key)
+        if codes is None:
+            return self.empty
+        return self._bitmaps.get_or_compute(key, lambda: self._bitmap(codes))
+
+    def any_of(self, keys: Iterable) -> np.ndarray:
+        return self.matching(set(keys).__contains__)
+
+    def matching(self, predicate: Callable) -> np.ndarray:
+        """The rows whose key is accepted by `predicate`, from one pass over the codes."""
+        selected = [key for key in self.key_codes if predicate(key)]
+        if not selected:
+            return self.empty
+        if len(selected) == 1:
+            return self.eq(selected[0])
+        return self._bitmap([code for key in selected for code in self.key_codes[key]])
+
+    def clear(self) -> None:
+        """Drop the bitmaps built so far."""
+        self._bitmaps.clear()
+
+    def _bitmap(self, codes: list[int]) -> np.ndarray:
+        bitmap = self.codes == codes[0] if len(codes) == 1 else np.isin(self.codes, codes)
+        bitmap.flags.writeable = False
+        return bitmap
+
+
+class SortedIndex:
+    """
+    A sorted permutation of a numeric column for answering range predicates.
+
+    `span()` turns bounds into a slice of sorted positions by binary search, and
+    `rows()` maps that slice back to row ids, so a range lookup costs O(log n + k).
+    """
+
+    def __init__(self, values: np.ndarray):
+        self.order = np.argsort(values, kind="stable")
+        self.order.flags.writeable = False
+        self.sorted = values[self.order]
+        self.sorted.flags.writeable = False
+        # NaNs sort last and never satisfy a range predicate
+        self.n_valid = len(values) - int(np.count_nonzero(np.isnan(self.sorted)))
+
+    def span(
+        self,
+        low: Optional[float] = None,
+        high: Optional[float] = None,
+        low_inclusive: bool = True,
+        high_inclusive: bool = True,
+    ) -> tuple[int, int]:
+        start, stop = 0, self.n_valid
+        valid = self.sorted[: self.n_valid]
+        if low is not None:
+            start = int(np.searchsorted(valid, low, side="left" if low_inclusive else "right"))
+        if high is not None:
+            stop = int(np.searchsorted(valid, high, side="right" if high_inclusive else "left"))
+        return start, max(start, stop)
+
+    def rows(self, start: int, stop: int) -> np.ndarray:
+        """Row ids (in ascending order) of the sorted positions `start:stop`."""
+        return np.sort(self.order[start:stop])
+
+
+class Dataset:
+    """
+    A read-only table that is loaded once per process and shared by every session.
+
+    Sessions never copy the frame. Their filter state is a boolean row mask over it
+    (`None` meaning "all rows"), and rows are only materialized through `take()` when a
+    renderer actually needs a DataFrame.
+    """
+
+    def __init__(
+        self,
+        frame: pd.DataFrame,
+        name: str = "tips",
+        range_indexes: Optional[Iterable[str]] = None,
+        version: Optional[str] = None,
+    ):
+        self.name = name
+        self.frame = frame
+        self.columns = frame.columns.tolist()
+        self.n_rows = len(frame)
+        # Callers that already know which version of the data this is (e.g. from the
+        # columnar cache key) spare the full content hash
+        self.version = version or fingerprint(frame)
+
+        self._arrays: dict[str, np.ndarray] = {}
+        for column in self.columns:
+            values = frame[column].to_numpy()
+            values.flags.writeable = False
+            self._arrays[column] = values
+
+        self.indexes: dict[str, BitmapIndex] = {}
+        for column in self.columns:
+            if pd.api.types.is_float_dtype(frame[column]):
+                continue
+            codes, uniques = pd.factorize(frame[column])
+            if len(uniques) <= INDEX_MAX_CARDINALITY:
+                self.indexes[column] = BitmapIndex(codes, uniques, self.is_numeric(column))
+
+        # Sorted indexes are optional; by default every float column gets one
+        if range_indexes is None:
+            range_indexes = [c for c in self.columns if pd.api.types.is_float_dtype(frame[c])]
+        self.sorted_indexes: dict[str, SortedIndex] = {
+            column: SortedIndex(self._arrays[column].astype(float, copy=False)) for column in range_indexes
+        }
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def column(self, name: str) -> np.ndarray:
+        """The read-only values of a column, without copying."""
+        return self._arrays[name]
+
+    def index(self, name: str) -> Optional[BitmapIndex]:
+        """The bitmap index of a low-cardinality column, if one was built."""
+        return self.indexes.get(name)
+
+    def sorted_index(self, name: str) -> Optional[SortedIndex]:
+        """The sorted range index of a numeric column, if one was built."""
+        return self.sorted_indexes.get(name)
+
+    def is_numeric(self, name: str) -> bool:
+        return pd.api.types.is_numeric_dtype(self.frame[name])
+
+    def clear_index_caches(self) -> None:
+        """Drop the row bitmaps the indexes have built, e.g. to time building them."""
+        for index in self.indexes.values():
+            index.clear()
+
+    def count(self, mask: Optional[np.ndarray]) -> int:
+        return self.n_rows if mask is None else int(np.count_nonzero(mask))
+
+    def selection_key(self, mask: Optional[np.ndarray]) -> str:
+        """A short digest identifying the rows selected by `mask`, for cache keys."""
+        if mask is None:
+            return "all"
+        return hashlib.sha1(np.packbits(mask).tobytes()).hexdigest()[:16]
+
+    def take(self, mask: Optional[np.ndarray]) -> pd.DataFrame:
+        """Materialize the rows selected by `mask` (the shared frame itself when unfiltered)."""
+        if mask is None:
+            return self.frame
+        return self.frame[mask]
+
+
+def fingerprint(frame: pd.DataFrame) -> str:
+    """A digest of a frame's dtypes and contents, identifying one version of the data."""
+    digest = hashlib.sha1()
+    digest.update(repr(list(frame.dtypes.items())).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from cache import LRUCache
+from dataset import Dataset
+
+# Outliers drawn per group at most; beyond that an evenly spaced subset (always
+# including the extremes) is shown
+MAX_OUTLIERS = 200
+# Points of the grid each violin's density is evaluated on
+KDE_GRID = 100
+# Fine bins the density is estimated from, and the most values binned per group; larger
+# groups are thinned to evenly spaced order statistics, which keeps their shape
+KDE_BINS = 512
+KDE_MAX_VALUES = 20_000
+
+DISTRIBUTION_CACHE_BYTES = 16 * 1024 * 1024
+distribution_cache = LRUCache(
+    DISTRIBUTION_CACHE_BYTES, size=lambda groups: sum(group.nbytes() for group in groups) if groups else 0
+)
+
+
+class GroupStats(NamedTuple):
+    """The summary a box and a violin are drawn from, for one group of rows."""
+
+    label: object
+    count: int
+    q1: float
+    median: float
+    q3: float
+    lower_fence: float
+    upper_fence: float
+    outliers: np.ndarray
+    grid: np.ndarray
+    density: np.ndarray
+
+    def nbytes(self) -> int:
+        return self.outliers.nbytes + self.grid.nbytes + self.density.nbytes + 128
+
+
+def group_distributions(
+    dataset: Dataset, mask: Optional[np.ndarray], by: str, column: str
+) -> Optional[list[GroupStats]]:
+    """
+    Box and violin statistics of `column` for each value of `by`, over the selected rows.
+
+    Returns None when `by` has no bitmap index (too many distinct values) or `column` is
+    not numeric. Results are cached per selection. Rows are pre-sorted by (group, value)
+    once per column pair, so quantiles and fences are lookups into the sorted values and
+    only the selection has to be gathered; unfiltered views do not touch the rows at all.
+    """
+    if dataset.index(by) is None or not dataset.is_numeric(column):
+        return None
+    key = (dataset.version, dataset.selection_key(mask), by, column)
+    return distribution_cache.get_or_compute(key, lambda: _distributions(dataset, mask, by, column))
+
+
+def _distributions(dataset: Dataset, mask: Optional[np.ndarray], by: str, column: str) -> list[GroupStats]:
+    order, values, bounds = _grouped_order(dataset, by, column)
+    selected = None if mask is None else mask[order]
+    labels = dataset.index(by).labels
+    groups = []
+    for code, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        group = values[start:stop] if selected is None else values[start:stop][selected[start:stop]]
+        if len(group):
+            groups.append(_group_stats(labels[code], group))
+    return groups
+
+
+@lru_cache(maxsize=8)
+def _grouped_order(dataset: Dataset, by: str, column: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Rows with a group and a value, ordered by group code and then by value
+    codes = dataset.index(by).codes
+    values = dataset.column(column).astype(float)
+    rows = np.flatnonzero((codes >= 0) & ~np.isnan(values))
+    order = rows[np.lexsort((values[rows], codes[rows]))]
+    bounds = np.searchsorted(codes[order], np.arange(len(dataset.index(by).labels) + 1))
+    sorted_values = values[order]
+    for array in (order, sorted_values):
+        array.flags.writeable = False
+    return order, sorted_values, bounds
+
+
+def _group_stats(label, values: np.ndarray) -> GroupStats:
+    # `values` is sorted, so every order statistic is a lookup
+    q1, median, q3 = (_quantile(values, q) for q in (0.25, 0.5, 0.75))
+    iqr = q3 - q1
+    low = np.searchsorted(values, q1 - 1.5 * iqr, side="left")
+    high = np.searchsorted(values, q3 + 1.5 * iqr, side="right")
+    outliers = np.concatenate([values[:low], values[high:]])
+    if len(outliers) > MAX_OUTLIERS:
+        outliers = outliers[np.linspace(0, len(outliers) - 1, MAX_OUTLIERS).round().astype(np.int64)]
+    grid, density = _kde(values, iqr)
+    return GroupStats(
+        label, len(values), q1, median, q3, float(values[low]), float(values[high - 1]), outliers, grid, density
+    )
+
+
+def _quantile(values: np.ndarray, q: float) -> float:
+    # Linear interpolation between order statistics, as np.quantile does
+    position = q * (len(values) - 1)
+    below = int(position)
+    above = min(below + 1, len(values) - 1)
+    return float(values[below] + (values[above] - values[below]) * (position - below))
+
+
+def _kde(values: np.ndarray, iqr: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    A Gaussian kernel density on `KDE_GRID` points spanning the values plus two
+    bandwidths (as Plotly's violins do), with Silverman's bandwidth, estimated from
+    binned values.
+    """
+    n = len(values)
+    if n > KDE_MAX_VALUES:
+        values = values[np.linspace(0, n - 1, KDE_MAX_VALUES).round().astype(np.int64)]
+    spread = min(values.std(), iqr / 1.34) or values.std()
+    bandwidth = 0.9 * spread * n ** -0.2 if spread else max(abs(values[0]) * 0.01, 1e-3)
+
+    low, high = values[0] - 2 * bandwidth, values[-1] + 2 * bandwidth
+    counts, edges = np.histogram(values, bins=KDE_BINS, range=(low, high))
+    centers = (edges[:-1] + edges[1:]) / 2
+    grid = np.linspace(low, high, KDE_GRID)
+    kernel = np.exp(-0.5 * ((grid[:, None] - centers[None, :]) / bandwidth) ** 2)
+    density = kernel @ counts / (counts.sum() * bandwidth * np.sqrt(2 * np.pi))
+    return grid, density
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+# Cells per axis of the grid scatter samples are stratified over
+SCATTER_GRID = 64
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of `n_out` points chosen by Largest-Triangle-Three-Buckets.
+
+    `x` must be sorted. The first and last points are always kept; every bucket in
+    between keeps the point forming the largest triangle with the point kept from the
+    previous bucket and the mean of the next one, which preserves peaks and troughs.
+    """
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        raise ValueError("LTTB needs at least 3 output points.")
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Interior points are split into n_out - 2 buckets of (almost) equal size
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    starts, stops = edges[:-1], edges[1:]
+    counts = stops - starts
+    x_means = np.add.reduceat(x[1 : n - 1], starts - 1) / counts
+    y_means = np.add.reduceat(y[1 : n - 1], starts - 1) / counts
+    x_means = np.append(x_means, x[-1])
+    y_means = np.append(y_means, y[-1])
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i, (start, stop) in enumerate(zip(starts, stops)):
+        ax, ay = x[previous], y[previous]
+        cx, cy = x_means[i + 1], y_means[i + 1]
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs((ax - cx) * (y[start:stop] - ay) - (ax - x[start:stop]) * (cy - ay))
+        previous = start + int(np.nanargmax(area)) if not np.isnan(area).all() else start
+        kept[i + 1] = previous
+    return kept
+
+
+def stratified_sample(x: pd.Series, y: pd.Series, n_out: int, seed: int = 0) -> np.ndarray:
+    """
+    Sorted indices of `n_out` rows sampled in proportion to the density of a grid over
+    (x, y).
+
+    Every occupied grid cell keeps at least one row, so sparse regions and outliers stay
+    visible while dense regions are thinned; the grid is coarsened until its occupied
+    cells fit the budget. The rest of the budget is shared in proportion to cell size by
+    largest remainder, so exactly `n_out` rows are kept. The sample is deterministic for
+    a given seed.
+    """
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+
+    x_codes, y_codes = _grid_codes(x), _grid_codes(y)
+    grid = SCATTER_GRID
+    while True:
+        cells = _coarsen(x_codes, grid) * (grid + 1) + _coarsen(y_codes, grid)
+        _, cells, counts = np.unique(cells, return_inverse=True, return_counts=True)
+        if len(counts) <= n_out or grid == 1:
+            break
+        grid //= 2
+
+    if len(counts) > n_out:
+        # Too small a budget for even the coarsest grid: one row from each of a random
+        # subset of the cells
+        quotas = np.zeros(len(counts), dtype=np.int64)
+        quotas[rng.choice(len(counts), n_out, replace=False)] = 1
+    else:
+        # One row per occupied cell, and the rest of the budget shared in proportion to
+        # the rows beyond the first
+        spare = n_out - len(counts)
+        shares = (counts - 1) * (spare / (n - len(counts)))
+        quotas = np.floor(shares).astype(np.int64)
+        leftover = spare - int(quotas.sum())
+        if leftover:
+            quotas[np.argsort(quotas - shares, kind="stable")[:leftover]] += 1
+        quotas += 1
+
+    # Rank the rows of each cell in a random order and keep the first `quota` of them
+    order = rng.permutation(n)
+    order = order[np.argsort(cells[order], kind="stable")]
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    ranks = np.arange(n) - np.repeat(starts, counts)
+    return np.sort(order[ranks < np.repeat(quotas, counts)])
+
+
+def _coarsen(codes: np.ndarray, grid: int) -> np.ndarray:
+    # Fine grid codes merged into `grid` cells per axis; missing values keep their own
+    if grid == SCATTER_GRID:
+        return codes
+    return np.where(codes == SCATTER_GRID, grid, codes * grid // SCATTER_GRID)
+
+
+def _grid_codes(values: pd.Series) -> np.ndarray:
+    # Numeric columns are cut into equal-width cells, others use one cell per category;
+    # missing values share the extra cell
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        array = values.to_numpy(dtype=float)
+        valid = ~np.isnan(array)
+        codes = np.full(len(array), SCATTER_GRID, dtype=np.int64)
+        if valid.any():
+            low, high = array[valid].min(), array[valid].max()
+            scaled = (array[valid] - low) / (high - low) if high > low else np.zeros(valid.sum())
+            codes[valid] = np.minimum((scaled * SCATTER_GRID).astype(np.int64), SCATTER_GRID - 1)
+        return codes
+    codes, _ = pd.factorize(values)
+    return np.where(codes < 0, SCATTER_GRID, codes % SCATTER_GRID)
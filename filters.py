@@ -0,0 +1,466 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from dataset import Dataset, SortedIndex
+
+# Grammar (keywords are case-insensitive):
+#
+#   expr       := and_expr ("or" and_expr)*
+#   and_expr   := not_expr ("and" not_expr)*
+#   not_expr   := "not" not_expr | "(" expr ")" | predicate
+#   predicate  := column op value
+#               | column ["not"] "in" "(" value ("," value)* ")"
+#               | column "between" value "and" value
+#   op         := = | == | != | > | < | >= | <= | ~
+
+_TOKEN_RE = re.compile(
+    r"""\s*(?:
+        (?P<string>'[^']*'|"[^"]*")
+      | (?P<op>>=|<=|!=|==|=|>|<|~)
+      | (?P<punct>[()\[\],])
+      | (?P<word>[^\s()\[\],=<>!~'"]+)
+    )""",
+    re.VERBOSE,
+)
+_KEYWORDS = {"and", "or", "not", "in", "between"}
+
+# Range predicates answered from a sorted index are only used as row-id candidates
+# when they select at most this fraction of the rows; wider ranges scan the column.
+RANGE_INDEX_MAX_SELECTIVITY = 0.1
+
+# Masks of recently applied filters, shared by every session in the process
+FILTER_CACHE_BYTES = 64 * 1024 * 1024
+result_cache = LRUCache(FILTER_CACHE_BYTES)
+_CLOSING = {"(": ")", "[": "]"}
+
+
+class FilterError(ValueError):
+    """Raised when a filter expression cannot be parsed or evaluated."""
+
+
+class Node:
+    """
+    A node of a parsed filter expression.
+
+    `evaluate` returns a mask over every row of the dataset, `evaluate_at` a mask aligned
+    with an array of row ids, and `candidate_rows` the (sorted) row ids that may match
+    when they can be found cheaply from a sorted index, or None otherwise.
+    """
+
+    columns: frozenset = frozenset()
+
+    def evaluate(self, dataset: Dataset) -> np.ndarray:
+        raise NotImplementedError
+
+    def evaluate_at(self, dataset: Dataset, rows: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def candidate_rows(self, dataset: Dataset) -> Optional[np.ndarray]:
+        return None
+
+
+class Compare(Node):
+    def __init__(self, column: str, op: str, value: str):
+        self.column = column
+        self.op = "=" if op == "==" else op
+        self.value = value
+        self.columns = frozenset([column])
+
+    def evaluate(self, dataset: Dataset) -> np.ndarray:
+        rows = self.candidate_rows(dataset)
+        if rows is not None:
+            return _rows_to_mask(dataset, rows)
+        return self._test(dataset, None)
+
+    def evaluate_at(self, dataset: Dataset, rows: np.ndarray) -> np.ndarray:
+        return self._test(dataset, rows)
+
+    def candidate_rows(self, dataset: Dataset) -> Optional[np.ndarray]:
+        index = dataset.sorted_index(self.column)
+        if index is None or self.op not in ("=", ">", "<", ">=", "<="):
+            return None
+        number = _number(self.value, self)
+        if self.op == "=":
+            start, stop = index.span(number, number)
+        elif self.op in (">", ">="):
+            start, stop = index.span(low=number, low_inclusive=self.op == ">=")
+        else:
+            start, stop = index.span(high=number, high_inclusive=self.op == "<=")
+        return _selective_rows(dataset, index, start, stop)
+
+    def _test(self, dataset: Dataset, rows: Optional[np.ndarray]) -> np.ndarray:
+        values = _values(dataset, self.column, rows)
+        index = dataset.index(self.column)
+        if self.op == "~":
+            try:
+                pattern = re.compile(self.value)
+                if index and not index.numeric:
+                    return _at(index.matching(lambda key: pattern.search(key) is not None), rows)
+                return _lowered(values).str.contains(self.value).to_numpy()
+            except (re.error, ValueError) as e:
+                # ValueError covers the regex errors of Arrow-backed string columns
+                raise FilterError(f"Invalid pattern '{self.value}' in '{self}': {e}") from e
+        if self.op in ("=", "!="):
+            if index:
+                key = index.key(_number(self.value, self)) if index.numeric else self.value
+                mask = _at(index.eq(key), rows)
+            elif dataset.is_numeric(self.column):
+                mask = values == _number(self.value, self)
+            else:
+                mask = _lowered(values).to_numpy() == self.value
+            return ~mask if self.op == "!=" else mask
+        if not dataset.is_numeric(self.column):
+            raise FilterError(f"Column '{self.column}' is not numeric; '{self.op}' needs a number.")
+        number = _number(self.value, self)
+        if self.op == ">":
+            return values > number
+        if self.op == "<":
+            return values < number
+        if self.op == ">=":
+            return values >= number
+        return values <= number
+
+    def __str__(self):
+        return f"{self.column}{self.op}{self.value}"
+
+
+class In(Node):
+    def __init__(self, column: str, values: list[str]):
+        self.column = column
+        self.values = values
+        self.columns = frozenset([column])
+
+    def evaluate(self, dataset: Dataset) -> np.ndarray:
+        return self._test(dataset, None)
+
+    def evaluate_at(self, dataset: Dataset, rows: np.ndarray) -> np.ndarray:
+        return self._test(dataset, rows)
+
+    def _test(self, dataset: Dataset, rows: Optional[np.ndarray]) -> np.ndarray:
+        values = _values(dataset, self.column, rows)
+        index = dataset.index(self.column)
+        if index:
+            return _at(index.any_of(_number(v, self) if index.numeric else v for v in self.values), rows)
+        if dataset.is_numeric(self.column):
+            return np.isin(values, [_number(v, self) for v in self.values])
+        return np.isin(_lowered(values).to_numpy(), self.values)
+
+    def __str__(self):
+        return f"{self.column} in ({', '.join(self.values)})"
+
+
+class Between(Node):
+    def __init__(self, column: str, low: str, high: str):
+        self.column = column
+        self.low = low
+        self.high = high
+        self.columns = frozenset([column])
+
+    def evaluate(self, dataset: Dataset) -> np.ndarray:
+        rows = self.candidate_rows(dataset)
+        if rows is not None:
+            return _rows_to_mask(dataset, rows)
+        return self._test(dataset, None)
+
+    def evaluate_at(self, dataset: Dataset, rows: np.ndarray) -> np.ndarray:
+        return self._test(dataset, rows)
+
+    def candidate_rows(self, dataset: Dataset) -> Optional[np.ndarray]:
+        index = dataset.sorted_index(self.column)
+        if index is None:
+            return None
+        start, stop = index.span(_number(self.low, self), _number(self.high, self))
+        return _selective_rows(dataset, index, start, stop)
+
+    def _test(self, dataset: Dataset, rows: Optional[np.ndarray]) -> np.ndarray:
+        values = _values(dataset, self.column, rows)
+        if not dataset.is_numeric(self.column):
+            raise FilterError(f"Column '{self.column}' is not numeric; 'between' needs numbers.")
+        low, high = _number(self.low, self), _number(self.high, self)
+        mask = values >= low
+        mask &= values <= high
+        return mask
+
+    def __str__(self):
+        return f"{self.column} between {self.low} and {self.high}"
+
+
+class Not(Node):
+    def __init__(self, child: Node):
+        self.child = child
+        self.columns = child.columns
+
+    def evaluate(self, dataset: Dataset) -> np.ndarray:
+        return ~self.child.evaluate(dataset)
+
+    def evaluate_at(self, dataset: Dataset, rows: np.ndarray) -> np.ndarray:
+        return ~self.child.evaluate_at(dataset, rows)
+
+
+class And(Node):
+    def __init__(self, children: list[Node]):
+        self.children = children
+        self.columns = frozenset().union(*(c.columns for c in children))
+
+    def evaluate(self, dataset: Dataset) -> np.ndarray:
+        rows = self.candidate_rows(dataset)
+        if rows is not None:
+            return _rows_to_mask(dataset, rows)
+        first, *rest = self.children
+        mask = first.evaluate(dataset)
+        for child in rest:
+            # Fuse into a single output buffer and stop once no rows survive
+            if not mask.any():
+                break
+            mask = np.logical_and(mask, child.evaluate(dataset), out=None if child is rest[0] else mask)
+        return mask
+
+    def evaluate_at(self, dataset: Dataset, rows: np.ndarray) -> np.ndarray:
+        mask = np.ones(len(rows), dtype=bool)
+        for child in self.children:
+            mask &= child.evaluate_at(dataset, rows)
+        return mask
+
+    def candidate_rows(self, dataset: Dataset) -> Optional[np.ndarray]:
+        # Start from the smallest range-index hit and only test the other
+        # predicates on those rows
+        best, rows = None, None
+        for child in self.children:
+            child_rows = child.candidate_rows(dataset)
+            if child_rows is not None and (rows is None or len(child_rows) < len(rows)):
+                best, rows = child, child_rows
+        if rows is None:
+            return None
+        for child in self.children:
+            if child is not best and len(rows):
+                rows = rows[child.evaluate_at(dataset, rows)]
+        return rows
+
+
+class Or(Node):
+    def __init__(self, children: list[Node]):
+        self.children = children
+        self.columns = frozenset().union(*(c.columns for c in children))
+
+    def evaluate(self, dataset: Dataset) -> np.ndarray:
+        first, *rest = self.children
+        mask = first.evaluate(dataset)
+        for child in rest:
+            mask = np.logical_or(mask, child.evaluate(dataset), out=None if child is rest[0] else mask)
+        return mask
+
+    def evaluate_at(self, dataset: Dataset, rows: np.ndarray) -> np.ndarray:
+        mask = np.zeros(len(rows), dtype=bool)
+        for child in self.children:
+            mask |= child.evaluate_at(dataset, rows)
+        return mask
+
+
+class CompiledFilter:
+    """A parsed filter expression that evaluates to a boolean row mask."""
+
+    def __init__(self, text: str, tree: Node):
+        self.text = text
+        self.tree = tree
+        self.columns = tree.columns
+
+    def __call__(self, dataset: Dataset) -> np.ndarray:
+        mask = self.tree.evaluate(dataset)
+        mask.flags.writeable = False
+        return mask
+
+    def __repr__(self):
+        return f"CompiledFilter({self.text!r})"
+
+
+def normalize(text: str) -> str:
+    """Canonical form of a filter string, used as the compile cache key."""
+    text = " ".join(text.lower().split()).rstrip(".")
+    # Models often wrap the whole command in backticks or quotes
+    while len(text) > 1 and text[0] == text[-1] and text[0] in "`'\"":
+        text = text[1:-1].strip().rstrip(".")
+    return text
+
+
+def compile_filter(text: str) -> CompiledFilter:
+    return _compile(normalize(text))
+
+
+def apply_filter(text: str, dataset: Dataset) -> np.ndarray:
+    """
+    The row mask selected by a filter string.
+
+    Results are cached process-wide by normalized filter text and dataset version, so
+    sessions sending the same filter share one read-only mask.
+    """
+    compiled = compile_filter(text)
+    return result_cache.get_or_compute((compiled.text, dataset.version), lambda: compiled(dataset))
+
+
+@lru_cache(maxsize=256)
+def _compile(text: str) -> CompiledFilter:
+    if not text:
+        raise FilterError("Empty filter command.")
+    parser = _Parser(text)
+    tree = parser.parse()
+    return CompiledFilter(text, tree)
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = self._tokenize(text)
+        self.pos = 0
+
+    def _tokenize(self, text: str) -> list[tuple[str, str]]:
+        tokens = []
+        pos = 0
+        text = text.rstrip()
+        while pos < len(text):
+            match = _TOKEN_RE.match(text, pos)
+            if not match or match.end() == pos:
+                raise FilterError(f"Invalid filter command format for '{text}'.")
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == "string":
+                value = value[1:-1]
+            elif kind == "word" and value in _KEYWORDS:
+                kind = "keyword"
+            tokens.append((kind, value))
+            pos = match.end()
+        return tokens
+
+    def parse(self) -> Node:
+        node = self._or()
+        if self._peek() is not None:
+            raise FilterError(f"Invalid filter command format for '{self.text}'.")
+        return node
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            raise FilterError(f"Incomplete filter command '{self.text}'.")
+        self.pos += 1
+        return token
+
+    def _accept(self, kind: str, value: str | None = None) -> bool:
+        token = self._peek()
+        if token and token[0] == kind and (value is None or token[1] == value):
+            self.pos += 1
+            return True
+        return False
+
+    def _expect(self, kind: str, value: str | None = None):
+        if not self._accept(kind, value):
+            raise FilterError(f"Invalid filter command format for '{self.text}'.")
+
+    def _or(self) -> Node:
+        children = [self._and()]
+        while self._accept("keyword", "or"):
+            children.append(self._and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def _and(self) -> Node:
+        children = [self._not()]
+        while self._accept("keyword", "and"):
+            children.append(self._not())
+        return children[0] if len(children) == 1 else And(children)
+
+    def _not(self) -> Node:
+        if self._accept("keyword", "not"):
+            return Not(self._not())
+        if self._accept("punct", "("):
+            node = self._or()
+            self._expect("punct", ")")
+            return node
+        return self._predicate()
+
+    def _predicate(self) -> Node:
+        kind, column = self._next()
+        if kind != "word":
+            raise FilterError(f"Invalid filter command format for '{self.text}'.")
+        if self._accept("keyword", "between"):
+            low = self._value()
+            self._expect("keyword", "and")
+            return Between(column, low, self._value())
+        negate = self._accept("keyword", "not")
+        if self._accept("keyword", "in"):
+            node = In(column, self._value_list())
+            return Not(node) if negate else node
+        if negate:
+            raise FilterError(f"Invalid filter command format for '{self.text}'.")
+        kind, op = self._next()
+        if kind != "op":
+            raise FilterError(f"Invalid filter command format for '{self.text}'.")
+        return Compare(column, op, self._value())
+
+    def _value(self) -> str:
+        kind, value = self._next()
+        if kind == "string":
+            return value
+        if kind != "word":
+            raise FilterError(f"Invalid filter command format for '{self.text}'.")
+        # Bare values may span several words, e.g. `time=late lunch`
+        words = [value]
+        while (token := self._peek()) and token[0] == "word":
+            words.append(token[1])
+            self.pos += 1
+        return " ".join(words)
+
+    def _value_list(self) -> list[str]:
+        kind, opening = self._next()
+        if opening not in _CLOSING:
+            raise FilterError(f"Invalid filter command format for '{self.text}'.")
+        values = [self._value()]
+        while self._accept("punct", ","):
+            values.append(self._value())
+        self._expect("punct", _CLOSING[opening])
+        return values
+
+
+def _column(dataset: Dataset, column: str) -> np.ndarray:
+    if column not in dataset.columns:
+        raise FilterError(f"Column '{column}' not found.")
+    return dataset.column(column)
+
+
+def _values(dataset: Dataset, column: str, rows: Optional[np.ndarray]) -> np.ndarray:
+    values = _column(dataset, column)
+    return values if rows is None else values[rows]
+
+
+def _at(mask: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+    return mask if rows is None else mask[rows]
+
+
+def _lowered(values: np.ndarray) -> pd.Series:
+    return pd.Series(values, copy=False).astype(str).str.lower()
+
+
+def _selective_rows(dataset: Dataset, index: SortedIndex, start: int, stop: int) -> Optional[np.ndarray]:
+    if stop - start > len(dataset) * RANGE_INDEX_MAX_SELECTIVITY:
+        return None
+    return index.rows(start, stop)
+
+
+def _rows_to_mask(dataset: Dataset, rows: np.ndarray) -> np.ndarray:
+    mask = np.zeros(len(dataset), dtype=bool)
+    mask[rows] = True
+    return mask
+
+
+def _number(value: str, node: Node) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        raise FilterError(f"Invalid value for filtering in '{node}'.") from None
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+from chatlas import Turn
+
+from commands import CommandParser
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+SUMMARY_ACK = "Understood."
+
+
+def estimate_tokens(text: str) -> int:
+    """A cheap token estimate (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+class HistoryManager:
+    """
+    Keeps the conversation sent with each request within a token budget.
+
+    The last `keep_turns` exchanges are kept verbatim (fewer if even those exceed
+    `max_tokens`). Everything older is folded into one summary exchange at the start:
+    the user's earlier requests, shortened, and the dashboard commands still in effect.
+    Command echoes that later commands superseded (an old filter, an old plot, repeated
+    show/hide) are dropped.
+    """
+
+    def __init__(
+        self,
+        parser: CommandParser,
+        max_tokens: int = 3000,
+        keep_turns: int = 6,
+        max_summary_requests: int = 20,
+    ):
+        if keep_turns < 1:
+            raise ValueError("keep_turns must be at least 1.")
+        self.parser = parser
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.max_summary_requests = max_summary_requests
+
+    def trim(self, turns: Sequence[Turn]) -> Optional[list[Turn]]:
+        """The trimmed history, or None if `turns` already fits."""
+        turns = list(turns)
+        exchanges = _exchanges(turns)
+        summary_lines = []
+        if exchanges and _is_summary(exchanges[0]):
+            summary_lines = exchanges.pop(0)[0].text[len(SUMMARY_PREFIX):].strip().splitlines()
+
+        keep = min(self.keep_turns, len(exchanges))
+        while keep > 1 and _tokens(exchanges[-keep:]) > self.max_tokens:
+            keep -= 1
+        if keep == len(exchanges) and _tokens(exchanges) + _summary_tokens(summary_lines) <= self.max_tokens:
+            return None
+
+        # The summary counts against the budget too: keep fewer exchanges verbatim until
+        # it fits next to them, dropping its oldest requests if it still does not. `keep`
+        # is 0 when only a summary is left
+        while True:
+            folded, recent = exchanges[: len(exchanges) - keep], exchanges[len(exchanges) - keep :]
+            requests, state = self._summarize(summary_lines, folded)
+            budget = self.max_tokens - _tokens(recent)
+            while requests and _summary_tokens(requests + state) > budget:
+                requests.pop(0)
+            if keep <= 1 or _summary_tokens(requests + state) <= budget:
+                break
+            keep -= 1
+        # Past that, even the state in effect is cut, oldest lines first
+        while state and _summary_tokens(state) > budget:
+            state.pop(0)
+
+        summary = "\n".join(requests + state)
+        trimmed = [Turn("user", f"{SUMMARY_PREFIX}\n{summary}"), Turn("assistant", SUMMARY_ACK)] if summary else []
+        for exchange in recent:
+            trimmed.extend(exchange)
+        return trimmed
+
+    def _summarize(self, previous: list[str], exchanges: list[list[Turn]]) -> tuple[list[str], list[str]]:
+        """The summary's lines: the user's requests, oldest first, and the state still in effect."""
+        requests = [line for line in previous if line.startswith("- User asked:")]
+        state = {line.split(":", 1)[0]: line for line in previous if not line.startswith("- User asked:") and line}
+        for exchange in exchanges:
+            for turn in exchange:
+                if turn.role == "user":
+                    text = " ".join(turn.text.split())
+                    if text:
+                        requests.append(f"- User asked: {text[:120]}{'...' if len(text) > 120 else ''}")
+                    continue
+                # Only the latest filter/plot and the last show/hide of each element still matter
+                for command in self.parser.parse(turn.text):
+                    if command.kind in ("filter", "plot"):
+                        state[f"- Current {command.kind}"] = f"- Current {command.kind}: {_command_text(command)}"
+                    elif command.kind == "sql_filter":
+                        state["- Current filter"] = f"- Current filter: sql filter: {command.argument}"
+                    elif command.kind == "clear_filters":
+                        state.pop("- Current filter", None)
+                    elif command.kind in ("show", "hide"):
+                        state[f"- Element {command.target}"] = f"- Element {command.target}: {'shown' if command.kind == 'show' else 'hidden'}"
+                    elif command.kind in ("show_all", "hide_all"):
+                        state = {k: v for k, v in state.items() if not k.startswith("- Element")}
+                        state["- Elements"] = f"- Elements: all {'shown' if command.kind == 'show_all' else 'hidden'}"
+        requests = requests[-self.max_summary_requests:]
+        return requests, list(state.values())
+
+
+def _command_text(command) -> str:
+    if command.kind == "plot":
+        return f"plot {command.target}: {command.argument}"
+    return f"{command.kind}: {command.argument}"
+
+
+def _exchanges(turns: list[Turn]) -> list[list[Turn]]:
+    """Group turns into exchanges, each starting with a user message."""
+    exchanges: list[list[Turn]] = []
+    for turn in turns:
+        # User turns that only carry tool results belong to the exchange that made the call
+        if (turn.role == "user" and turn.text.strip()) or not exchanges:
+            exchanges.append([turn])
+        else:
+            exchanges[-1].append(turn)
+    return exchanges
+
+
+def _is_summary(exchange: list[Turn]) -> bool:
+    return exchange[0].role == "user" and exchange[0].text.startswith(SUMMARY_PREFIX)
+
+
+def _tokens(exchanges: list[list[Turn]]) -> int:
+    return sum(estimate_tokens(turn.text) for exchange in exchanges for turn in exchange)
+
+
+def _summary_tokens(lines: list[str]) -> int:
+    # The summary exchange as sent: the prefixed user turn and the acknowledgement
+    if not lines:
+        return 0
+    return estimate_tokens(SUMMARY_PREFIX + "\n" + "\n".join(lines)) + estimate_tokens(SUMMARY_ACK)
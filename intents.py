@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import re
+from typing import Optional
+
+from commands import VERBATIM_KINDS, CommandParser, plot_params
+from filters import FilterError, compile_filter
+from sql import SqlError, validate_sql
+
+# Words that carry no meaning for the command grammar ("please show me the data table")
+FILLER_WORDS = {
+    "please", "can", "could", "would", "will", "you", "me", "the", "a", "an", "now", "just",
+    "i", "want", "to", "see", "like", "let", "us", "lets", "let's", "go", "ahead", "and", "also",
+}
+
+# Common phrasings of commands that are not close enough to the grammar to match fuzzily
+ALIASES = {
+    "show all": "show everything",
+    "hide all": "hide everything",
+    "show table": "show data table",
+    "hide table": "hide data table",
+    "clear filter": "clear filters",
+    "reset filters": "clear filters",
+    "remove filters": "clear filters",
+    "reset": "clear filters",
+    "hide chart": "hide plot",
+    "hide visualization": "hide plot",
+}
+
+
+class IntentRouter:
+    """
+    Recognizes user input that is already a dashboard command, so it can skip the model.
+
+    Input is routed when, once filler words are removed, it either consists only of
+    commands from the grammar (e.g. "filter: sex=male", "show data table and hide plot")
+    whose arguments are valid for `columns`, or matches exactly one fixed command phrase
+    or alias word for word ("show total bil", "show all"). Only the names of columns and
+    dashboard elements tolerate typos, of one letter (two in names of eight or more
+    letters), and a word that is itself a known name is never read as another one. So
+    "show total tip" does not become "show total tippers". Anything else, including
+    input with extra words ("show average tip percentage by day"), goes to the model.
+    """
+
+    def __init__(self, parser: CommandParser, columns: list[str]):
+        self.parser = parser
+        self.columns = set(columns)
+        fixed = [phrase for phrase in parser.rules if not phrase.endswith(":")]
+        self.phrases = {phrase: phrase for phrase in fixed}
+        self.phrases.update(ALIASES)
+        self.names = {word for column in columns for word in column.lower().split("_")}
+        self.names |= {
+            word for phrase, (kind, _) in parser.rules.items() if kind in ("show", "hide") for word in phrase.split()[1:]
+        }
+
+    def route(self, user_input: str) -> Optional[str]:
+        """The command text to run for `user_input`, or None if the model should handle it."""
+        text = user_input.strip().lower()
+        if not text or "\n" in text:
+            return None
+
+        # Exact grammar: the input is nothing but commands (plus filler words)
+        if self.parser.has_command(text):
+            leftover = self.parser.pattern.split(_argument_free(self.parser, text))
+            if all(_is_filler(part) for part in leftover):
+                commands = self.parser.parse(user_input)
+                if all(self._valid_argument(command) for command in commands):
+                    return user_input.strip()
+                return None
+
+        # Near miss: the whole input is one fixed phrase, up to typos in names
+        words = [w for w in re.findall(r"[a-z']+", text) if w not in FILLER_WORDS]
+        matches = {command for phrase, command in self.phrases.items() if self._matches(words, phrase.split())}
+        # Input close to several commands is ambiguous; the model can ask
+        return matches.pop() if len(matches) == 1 else None
+
+    def _matches(self, words: list[str], phrase: list[str]) -> bool:
+        return len(words) == len(phrase) and all(
+            word == target
+            or (target in self.names and word not in self.names and _edit_distance(word, target) <= _typos(target))
+            for word, target in zip(words, phrase)
+        )
+
+    def _valid_argument(self, command) -> bool:
+        # A colon command's argument runs to the end of the line, so text after it that
+        # is meant for the model ("... and explain it") shows up as a bad argument
+        if command.kind == "filter":
+            try:
+                compile_filter(command.argument)
+            except FilterError:
+                return False
+            return True
+        if command.kind == "plot":
+            params = plot_params(command.target, command.argument)
+            return bool(params) and all(
+                params[axis] in self.columns for axis in ("x", "y", "z") if params.get(axis)
+            )
+        if command.kind == "hide_elements":
+            names = [name.strip() for name in command.argument.split(",")]
+            return all(f"hide {name}" in self.parser.rules for name in names)
+        if command.kind in ("sql_filter", "sql_query"):
+            try:
+                validate_sql(command.argument)
+            except SqlError:
+                return False
+            return True
+        return True
+
+
+def _argument_free(parser: CommandParser, text: str) -> str:
+    # Blank out the arguments of colon commands so they don't count as leftover text
+    spans = []
+    matches = list(parser.pattern.finditer(text))
+    for i, match in enumerate(matches):
+        if spans and match.start() < spans[-1][1]:
+            continue
+        if match.group(0).endswith(":"):
+            verbatim = parser.rules[match.group(0).lower()][0] in VERBATIM_KINDS
+            end = matches[i + 1].start() if i + 1 < len(matches) and not verbatim else len(text)
+            spans.append((match.end(), end))
+    for start, end in reversed(spans):
+        text = text[:start] + " " * (end - start) + text[end:]
+    return text
+
+
+def _is_filler(text: str) -> bool:
+    return all(word in FILLER_WORDS for word in re.findall(r"[a-z']+", text))
+
+
+def _typos(name: str) -> int:
+    # Letters a name may be mistyped by
+    return 0 if len(name) < 4 else 1 if len(name) < 8 else 2
+
+
+def _edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
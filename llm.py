@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import AsyncIterator, Optional
+
+import httpx
+from chatlas import Chat, ChatGoogle
+from google.genai import types
+
+from app_utils import llm_backend, mock_llm_options
+from mock_llm import MockChat
+
+# Defaults for LLM_MAX_CONCURRENCY (model requests streaming at once across all sessions
+# of this process) and LLM_MAX_CONNECTIONS (size of the shared keep-alive pool). They are
+# read on first use, after the app has loaded its .env file.
+MAX_CONCURRENT_REQUESTS = 16
+MAX_CONNECTIONS = 32
+KEEPALIVE_EXPIRY = 120.0
+
+_providers: dict[str, object] = {}
+_request_slots: Optional[asyncio.Semaphore] = None
+
+
+def shared_provider(model: str):
+    """
+    The process-wide Gemini provider for `model`.
+
+    It owns a single `genai.Client`, and with it one pooled keep-alive HTTP client, so
+    sessions reuse open connections instead of each paying for its own TLS handshakes.
+    """
+    if model not in _providers:
+        max_connections = int(os.environ.get("LLM_MAX_CONNECTIONS", MAX_CONNECTIONS))
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+        chat = ChatGoogle(
+            api_key=os.environ.get("GOOGLE_API_KEY"),
+            model=model,
+            kwargs={"http_options": types.HttpOptions(async_client_args={"limits": limits})},
+        )
+        _providers[model] = chat.provider
+    return _providers[model]
+
+
+def new_chat(system_prompt: str, model: str):
+    """
+    A chat with its own conversation history on top of the shared transport, or an
+    offline `MockChat` when `LLM_BACKEND=mock`.
+    """
+    if llm_backend() == "mock":
+        options = mock_llm_options()
+        script_path = options.pop("script_path")
+        if script_path:
+            return MockChat.from_script_file(script_path, system_prompt=system_prompt, **options)
+        return MockChat(system_prompt, **options)
+    return Chat(provider=shared_provider(model), system_prompt=system_prompt)
+
+
+async def stream_async(chat, user_input: str) -> AsyncIterator[str]:
+    """
+    Like `chat.stream_async()`, but the stream holds one of the process-wide request
+    slots while it runs, so at most `LLM_MAX_CONCURRENCY` are in flight.
+    """
+    global _request_slots
+    if _request_slots is None:
+        _request_slots = asyncio.Semaphore(int(os.environ.get("LLM_MAX_CONCURRENCY", MAX_CONCURRENT_REQUESTS)))
+    slots = _request_slots
+
+    async def generate():
+        async with slots:
+            async for chunk in await chat.stream_async(user_input):
+                yield chunk
+
+    return generate()
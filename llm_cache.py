@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Optional
+
+from cache import LRUCache
+
+
+def normalize_prompt(text: str) -> str:
+    return " ".join(text.lower().split()).rstrip("?!. ")
+
+
+def cache_key(
+    user_input: str,
+    system_prompt: str,
+    model: str,
+    dataset_version: str,
+    history: Iterable[tuple[str, str]] = (),
+) -> str:
+    """
+    The cache key of a model request.
+
+    Besides the normalized input, the system prompt, model and dataset fingerprint, it
+    covers the earlier (role, text) turns of the conversation, since the reply to
+    "yes" or "now by day" depends on them. Opening questions therefore hit across
+    sessions, and so do later ones asked after the same exchange.
+    """
+    digest = hashlib.sha256()
+    for part in (normalize_prompt(user_input), system_prompt, model, dataset_version):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    for role, text in history:
+        digest.update(f"{role}:{text}".encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Caches complete model replies, optionally persisted in a SQLite file.
+
+    Entries expire after `ttl` seconds; the in-memory tier is an LRU bounded to
+    `max_bytes` of text and the on-disk tier keeps at most `max_entries` rows.
+    Concurrent requests for the same key are coalesced: only the first calls the model,
+    the others wait for its reply.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 3600,
+        max_bytes: int = 16 * 1024 * 1024,
+        max_entries: int = 10_000,
+        path: Optional[str | Path] = None,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory = LRUCache(max_bytes, size=lambda entry: len(entry[0]))
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, created REAL)"
+            )
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        if self._db is not None:
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and row[1] + self.ttl > now:
+                self._memory.put(key, (row[0], row[1] + self.ttl))
+                return row[0]
+        return None
+
+    def put(self, key: str, response: str) -> None:
+        now = time.time()
+        self._memory.put(key, (response, now + self.ttl))
+        if self._db is not None:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, response, now))
+            self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            self._db.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY created DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    async def stream(
+        self,
+        key: str,
+        produce: Callable[[], Awaitable[AsyncIterator[str]]],
+        on_replay: Optional[Callable[[str], None]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Yield the reply for `key`.
+
+        It comes from the cache, from an identical request already in flight, or live
+        from `produce()`, in which case it is cached once complete. `on_replay` is called
+        with the full text whenever the model was not called for this request.
+        """
+        cached = self.get(key)
+        if cached is None and key in self._inflight:
+            try:
+                cached = await asyncio.shield(self._inflight[key])
+            except Exception:
+                # The leading request failed; make our own call below
+                cached = None
+        if cached is not None:
+            if on_replay:
+                on_replay(cached)
+            yield cached
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        parts = []
+        try:
+            async for chunk in await produce():
+                parts.append(chunk)
+                yield chunk
+        except BaseException as e:
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("Request cancelled"))
+            future.exception()  # Mark as retrieved when nobody was waiting
+            raise
+        else:
+            response = "".join(parts)
+            self.put(key, response)
+            future.set_result(response)
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def stats(self) -> dict[str, int]:
+        stats = self._memory.stats()
+        stats["inflight"] = len(self._inflight)
+        return stats
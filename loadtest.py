@@ -0,0 +1,301 @@
+"""
+Load test for the dashboard: N simulated sessions chatting with the app concurrently.
+
+The app runs in a uvicorn subprocess with the offline mock chat backend, and each
+session speaks the Shiny websocket protocol the way a browser would (binding outputs as
+they are inserted). Latency is reported per stage (filter, plot, show/hide, other) at
+p50/p95/p99, along with the server's resident memory per session.
+
+    python loadtest.py --sessions 50 --rounds 2 --json loadtest.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+import websockets
+
+from summary import METRICS
+
+here = Path(__file__).parent
+
+SCRIPTS = [
+    [
+        "show everything",
+        "Filter for male smokers",
+        "Show box plot of total_bill by day",
+        "hide plot",
+        "clear filters",
+    ],
+    [
+        "What is the total bill?",
+        "filter: day in (sat, sun) and total_bill>20",
+        "Create scatter plot of total_bill vs tip",
+        "hide everything",
+    ],
+    [
+        "Show me the data table",
+        "Show histogram of total_bill",
+        "only dinner on saturday for women",
+        "Create heatmap of average tip by day and time",
+        "Show me the average tip percentage",
+    ],
+]
+OUTPUT_IDS = ["data_table", "plot_output", *METRICS]
+CLIENT_DATA = {
+    ".clientdata_url_protocol": "http:",
+    ".clientdata_url_hostname": "127.0.0.1",
+    ".clientdata_url_port": "",
+    ".clientdata_url_pathname": "/",
+    ".clientdata_url_search": "",
+    ".clientdata_url_hash_initial": "",
+    ".clientdata_url_hash": "",
+    ".clientdata_pixelratio": 1,
+}
+METRIC_NAMES = ("first_chat", "first_update", "complete")
+
+
+def stage(message: str) -> str:
+    text = message.lower()
+    if "filter" in text or re.search(r"\b(only|smokers?|women|men)\b", text):
+        return "filter"
+    if re.search(r"\b(plot|histogram|chart|heatmap|scatter)\b", text):
+        return "plot"
+    if re.search(r"\b(show|hide)\b", text):
+        return "show_hide"
+    return "other"
+
+
+class SimulatedSession:
+    """One browser session: sends chat messages and times the server's responses."""
+
+    def __init__(self, url: str, quiet: float, timeout: float):
+        self.url = url
+        self.quiet = quiet
+        self.timeout = timeout
+        self.samples: list[dict] = []
+
+    async def run(self, script: list[str], rounds: int, think_time: float, done: asyncio.Event):
+        async with websockets.connect(self.url, max_size=None) as ws:
+            await ws.send(json.dumps({"method": "init", "data": CLIENT_DATA}))
+            await self._drain(ws)
+            for _ in range(rounds):
+                for message in script:
+                    await asyncio.sleep(random.uniform(0, 2 * think_time))
+                    self.samples.append(await self._send(ws, message))
+            # Stay connected until every session is done so memory is measured under load
+            await done.wait()
+
+    async def _send(self, ws, message: str) -> dict:
+        sent = time.perf_counter()
+        await ws.send(json.dumps({"method": "update", "data": {"chat_user_input": message}}))
+        sample = {"stage": stage(message), "message": message, "first_chat": None, "first_update": None}
+        last = sent
+        finished = False
+        deadline = sent + self.timeout
+        while True:
+            wait = self.quiet if finished else deadline - time.perf_counter()
+            try:
+                raw = await asyncio.wait_for(ws.recv(), max(wait, 0))
+            except asyncio.TimeoutError:
+                break
+            now = time.perf_counter()
+            last = now
+            finished |= await self._handle(ws, json.loads(raw), sample, now - sent)
+        sample["complete"] = last - sent
+        sample["timed_out"] = not finished
+        return sample
+
+    async def _handle(self, ws, msg: dict, sample: dict, elapsed: float) -> bool:
+        """Record timings for one server message; True once the chat reply is complete."""
+        finished = False
+        chat = (msg.get("custom") or {}).get("shinyChatMessage")
+        if chat:
+            if sample["first_chat"] is None:
+                sample["first_chat"] = elapsed
+            chunk_type = chat["obj"].get("chunk_type")
+            finished = chat["handler"] == "shiny-chat-append-message" or chunk_type == "message_end"
+
+        bindings = {}
+        if "shiny-insert-ui" in msg:
+            html = msg["shiny-insert-ui"]["content"]["html"]
+            bindings = {f".clientdata_output_{oid}_hidden": False for oid in OUTPUT_IDS if f'id="{oid}"' in html}
+        elif "shiny-remove-ui" in msg:
+            selector = msg["shiny-remove-ui"]["selector"]
+            bindings = {f".clientdata_output_{oid}_hidden": True for oid in OUTPUT_IDS if selector.startswith(f"#{oid}")}
+        if bindings:
+            await ws.send(json.dumps({"method": "update", "data": bindings}))
+
+        if sample["first_update"] is None and (bindings or "shiny-remove-ui" in msg or msg.get("values")):
+            sample["first_update"] = elapsed
+        return finished
+
+    async def _drain(self, ws):
+        try:
+            while True:
+                await asyncio.wait_for(ws.recv(), self.quiet)
+        except asyncio.TimeoutError:
+            pass
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values) + 0.5) - 1))]
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def start_server(port: int, env: dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=here,
+        env={**os.environ, **env},
+    )
+
+
+async def wait_for_port(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Server did not start on port {port}")
+            await asyncio.sleep(0.2)
+
+
+async def run_load(args) -> dict:
+    env = {
+        "LLM_BACKEND": "mock",
+        "MOCK_LLM_TTFT": str(args.ttft),
+        "MOCK_LLM_CHUNK_DELAY": str(args.chunk_delay),
+        "MOCK_LLM_CHUNK_SIZE": str(args.chunk_size),
+    }
+    if args.llm_cache_ttl is not None:
+        env["LLM_CACHE_TTL"] = str(args.llm_cache_ttl)
+    server = start_server(args.port, env)
+    try:
+        await wait_for_port(args.port)
+        url = f"ws://127.0.0.1:{args.port}/websocket/"
+        # One warm-up session so imports and first-use caches are not billed to the load
+        await SimulatedSession(url, args.quiet, args.timeout).run(SCRIPTS[0][:1], 1, 0, _set(asyncio.Event()))
+        rss_before = rss_bytes(server.pid)
+
+        done = asyncio.Event()
+        sessions = [SimulatedSession(url, args.quiet, args.timeout) for _ in range(args.sessions)]
+        tasks = []
+        started = time.perf_counter()
+        for i, session in enumerate(sessions):
+            tasks.append(asyncio.create_task(session.run(SCRIPTS[i % len(SCRIPTS)], args.rounds, args.think_time, done)))
+            await asyncio.sleep(args.ramp / max(args.sessions, 1))
+        while sum(len(s.samples) for s in sessions) < sum(
+            len(SCRIPTS[i % len(SCRIPTS)]) * args.rounds for i in range(args.sessions)
+        ):
+            if any(t.done() and t.exception() for t in tasks):
+                break
+            await asyncio.sleep(0.1)
+        elapsed = time.perf_counter() - started
+        rss_after = rss_bytes(server.pid)
+        done.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        server.terminate()
+        server.wait()
+
+    samples = [sample for session in sessions for sample in session.samples]
+    return report(args, samples, elapsed, rss_before, rss_after)
+
+
+def report(args, samples: list[dict], elapsed: float, rss_before, rss_after) -> dict:
+    stages = {}
+    for name in sorted({s["stage"] for s in samples}):
+        group = [s for s in samples if s["stage"] == name]
+        stages[name] = {"count": len(group), "timeouts": sum(s["timed_out"] for s in group)}
+        for metric in METRIC_NAMES:
+            values = [s[metric] for s in group if s[metric] is not None]
+            stages[name][metric] = {f"p{q}": percentile(values, q) for q in (50, 95, 99)}
+    memory = {"rss_before": rss_before, "rss_after": rss_after, "rss_per_session": None}
+    if rss_before is not None and rss_after is not None:
+        memory["rss_per_session"] = (rss_after - rss_before) / max(args.sessions, 1)
+    return {
+        "sessions": args.sessions,
+        "rounds": args.rounds,
+        "requests": len(samples),
+        "elapsed": elapsed,
+        "throughput": len(samples) / elapsed if elapsed else None,
+        "stages": stages,
+        "memory": memory,
+    }
+
+
+def print_report(result: dict):
+    print(f"{result['sessions']} sessions, {result['requests']} requests in {result['elapsed']:.1f}s "
+          f"({result['throughput']:.1f} req/s)")
+    print(f"{'stage':<10} {'n':>5} {'metric':<13} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in result["stages"].items():
+        for metric in METRIC_NAMES:
+            cells = [stats[metric][p] for p in ("p50", "p95", "p99")]
+            cells = [f"{v * 1000:9.1f}" if v is not None else f"{'-':>9}" for v in cells]
+            print(f"{name:<10} {stats['count']:>5} {metric:<13} {' '.join(cells)}")
+        if stats["timeouts"]:
+            print(f"{'':<10} {stats['timeouts']:>5} timed out")
+    per_session = result["memory"]["rss_per_session"]
+    if per_session is not None:
+        print(f"server RSS {result['memory']['rss_after'] / 2**20:.1f} MiB, "
+              f"{per_session / 2**20:.2f} MiB per session")
+
+
+def _set(event: asyncio.Event) -> asyncio.Event:
+    event.set()
+    return event
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent simulated sessions")
+    parser.add_argument("--rounds", type=int, default=1, help="times each session repeats its script")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean pause between messages (s)")
+    parser.add_argument("--ramp", type=float, default=2.0, help="time over which sessions connect (s)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.3, help="mock time to first chunk (s)")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="mock delay between chunks (s)")
+    parser.add_argument("--chunk-size", type=int, default=8, help="mock chunk size (characters)")
+    parser.add_argument("--llm-cache-ttl", type=float, default=None, help="override LLM_CACHE_TTL (0 disables hits)")
+    parser.add_argument("--quiet", type=float, default=0.25, help="silence that ends a response (s)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-message timeout (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="also write the report to this file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    result = asyncio.run(run_load(args))
+    print_report(result)
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
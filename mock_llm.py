@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import re
+from pathlib import Path
+from typing import AsyncIterator, Optional, Sequence
+
+from chatlas import Turn
+
+COLUMNS = ("total_bill", "tip", "sex", "smoker", "day", "time", "size", "percent")
+DAYS = {"thursday": "thur", "thur": "thur", "friday": "fri", "fri": "fri", "saturday": "sat", "sat": "sat", "sunday": "sun", "sun": "sun"}
+
+# (pattern in the user input, reply); the first match wins
+RULES = [
+    (r"\b(clear|reset|remove)\b.*\bfilters?\b", "clear filters"),
+    (r"\bhide\b.*\beverything\b", "hide everything"),
+    (r"\b(show|display)\b.*\beverything\b", "show everything"),
+    (r"\bhide\b.*\b(plot|chart)\b", "hide plot"),
+    (r"\bhide\b.*\btable\b", "hide data table"),
+    (r"\btable\b", "show data table"),
+    (r"\btotal bill\b", "show total bill"),
+    (r"\b(tippers|how many)\b", "show total tippers"),
+    (r"\btip percentage\b", "show average tip percentage"),
+    (r"\baverage bill\b", "show average bill"),
+]
+
+
+class MockChat:
+    """
+    An offline stand-in for the Gemini chat client, for tests and benchmarks.
+
+    It answers with the dashboard command vocabulary, either from `script` (a list of
+    {"match": regex, "response": text} entries checked in order) or from built-in rules,
+    and streams the reply in `chunk_size`-character chunks after `ttft` seconds, with
+    `chunk_delay` seconds between chunks. History is kept as chatlas turns, like a real
+    chat, so the rest of the app cannot tell the difference.
+    """
+
+    def __init__(
+        self,
+        system_prompt: Optional[str] = None,
+        ttft: float = 0.3,
+        chunk_delay: float = 0.02,
+        chunk_size: int = 8,
+        script: Optional[list[dict]] = None,
+    ):
+        self.system_prompt = system_prompt
+        self.ttft = ttft
+        self.chunk_delay = chunk_delay
+        self.chunk_size = max(1, chunk_size)
+        self.script = [(re.compile(entry["match"], re.IGNORECASE), entry["response"]) for entry in script or []]
+        self._turns: list[Turn] = []
+
+    @classmethod
+    def from_script_file(cls, path: str | Path, **kwargs) -> "MockChat":
+        with open(path, "r") as f:
+            return cls(script=json.load(f), **kwargs)
+
+    def get_turns(self, include_system_prompt: bool = False) -> list[Turn]:
+        return list(self._turns)
+
+    def set_turns(self, turns: Sequence[Turn]) -> None:
+        self._turns = list(turns)
+
+    def add_turn(self, turn: Turn) -> None:
+        self._turns.append(turn)
+
+    def respond(self, user_input: str) -> str:
+        for pattern, response in self.script:
+            if pattern.search(user_input):
+                return response
+        return rule_based_response(user_input)
+
+    async def stream_async(self, user_input: str, **kwargs) -> AsyncIterator[str]:
+        response = self.respond(user_input)
+
+        async def generate():
+            await asyncio.sleep(self.ttft)
+            for i in range(0, len(response), self.chunk_size):
+                if i:
+                    await asyncio.sleep(self.chunk_delay)
+                yield response[i : i + self.chunk_size]
+            self._turns += [Turn("user", user_input), Turn("assistant", response)]
+
+        return generate()
+
+
+def rule_based_response(user_input: str) -> str:
+    text = user_input.lower()
+    columns = [c for c in re.findall(r"[a-z_]+", text) if c in COLUMNS]
+
+    plot = _plot_command(text, columns)
+    if plot:
+        return f"Here is the plot.\n{plot}"
+    conditions = _filter_conditions(text)
+    if conditions and re.search(r"\b(filter|only|show|for)\b", text):
+        return f"Filtering the data.\nfilter: {' and '.join(conditions)}"
+    for pattern, response in RULES:
+        if re.search(pattern, text):
+            return f"Sure.\n{response}"
+    return "I can show the data table and summary values, filter the data, and create plots."
+
+
+def _plot_command(text: str, columns: list[str]) -> Optional[str]:
+    if "histogram" in text and columns:
+        return f"plot histogram: {columns[0]}"
+    if ("bar" in text or "count" in text) and columns:
+        return f"plot bar: {columns[0]}"
+    if "heatmap" in text and len(columns) >= 3:
+        return f"plot heatmap: {columns[0]} by {columns[1]} and {columns[2]}"
+    for kind in ("scatter", "line"):
+        if kind in text and len(columns) >= 2:
+            return f"plot {kind}: {columns[0]} vs {columns[1]}"
+    for kind in ("box", "violin"):
+        if kind in text and len(columns) >= 2:
+            return f"plot {kind}: {columns[0]} by {columns[1]}"
+    return None
+
+
+def _filter_conditions(text: str) -> list[str]:
+    conditions = []
+    if re.search(r"\bfemales?\b|\bwomen\b", text):
+        conditions.append("sex=female")
+    elif re.search(r"\bmales?\b|\bmen\b", text):
+        conditions.append("sex=male")
+    if re.search(r"\bnon-?smokers?\b", text):
+        conditions.append("smoker=no")
+    elif re.search(r"\bsmokers?\b", text):
+        conditions.append("smoker=yes")
+    for word, day in DAYS.items():
+        if re.search(rf"\b{word}\b", text):
+            conditions.append(f"day={day}")
+            break
+    for meal in ("lunch", "dinner"):
+        if re.search(rf"\b{meal}\b", text):
+            conditions.append(f"time={meal}")
+    return conditions
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from dataset import Dataset
+
+AGGREGATIONS = ("mean", "sum", "count", "min", "max", "std")
+
+PIVOT_CACHE_BYTES = 16 * 1024 * 1024
+pivot_cache = LRUCache(PIVOT_CACHE_BYTES, size=lambda frame: int(frame.memory_usage(deep=True).sum()))
+
+# Cells a pivot table may have (8 bytes each); more than a heatmap can usefully show
+PIVOT_MAX_CELLS = 4_000_000
+
+
+def pivot(
+    dataset: Dataset, mask: Optional[np.ndarray], x: str, y: str, z: str, agg: str = "mean"
+) -> pd.DataFrame:
+    """
+    `agg` of `z` for every (x, y) pair over the selected rows, as an x-by-y table.
+
+    Equivalent to `frame.groupby([x, y])[z].agg(agg).unstack(fill_value=0)`: rows and
+    columns are the sorted values that occur in the selection, and empty cells are 0.
+    Group keys are the integer codes of the bitmap indexes (factorized once otherwise),
+    so each aggregation is a few `bincount`s over one combined cell code, over a grid of
+    only the keys the selection has. Results are cached per selection. Raises ValueError
+    if the table would have more than `PIVOT_MAX_CELLS` cells.
+    """
+    if agg not in AGGREGATIONS:
+        raise ValueError(f"Unsupported aggregation '{agg}'; use one of {', '.join(AGGREGATIONS)}.")
+    key = (dataset.version, dataset.selection_key(mask), x, y, z, agg)
+    return pivot_cache.get_or_compute(key, lambda: _pivot(dataset, mask, x, y, z, agg))
+
+
+def _pivot(dataset: Dataset, mask: Optional[np.ndarray], x: str, y: str, z: str, agg: str) -> pd.DataFrame:
+    x_codes, x_labels = _codes(dataset, x)
+    y_codes, y_labels = _codes(dataset, y)
+    values = dataset.column(z)
+    if agg != "count" or dataset.is_numeric(z):
+        values = values.astype(float)
+        valid = ~np.isnan(values)
+    else:
+        valid = ~pd.isna(values)
+
+    # Rows with both keys and a value; missing keys (code -1) are dropped, as groupby does
+    keep = (x_codes >= 0) & (y_codes >= 0) & valid
+    if mask is not None:
+        keep &= mask
+    # Only the keys that occur in the selection get a row or column of the grid, so its
+    # size is bounded by the result's rather than by the columns' cardinalities
+    x_keys, x_cells = np.unique(x_codes[keep], return_inverse=True)
+    y_keys, y_cells = np.unique(y_codes[keep], return_inverse=True)
+    cells = x_cells.astype(np.int64) * len(y_keys) + y_cells
+    n_cells = len(x_keys) * len(y_keys)
+    if n_cells > PIVOT_MAX_CELLS:
+        raise ValueError(
+            f"A heatmap of {x} by {y} would have {len(x_keys):,} x {len(y_keys):,} cells; "
+            "filter the data or use columns with fewer distinct values."
+        )
+    counts = np.bincount(cells, minlength=n_cells)
+    if agg == "count":
+        result = counts.astype(float)
+    else:
+        values = values[keep]
+        result = _aggregate(agg, cells, values, counts, n_cells)
+
+    result = np.where(counts > 0, result, 0.0).reshape(len(x_keys), len(y_keys))
+    rows = np.argsort(x_labels[x_keys], kind="stable")
+    columns = np.argsort(y_labels[y_keys], kind="stable")
+    table = pd.DataFrame(
+        result[np.ix_(rows, columns)],
+        index=pd.Index(x_labels[x_keys[rows]], name=x),
+        columns=pd.Index(y_labels[y_keys[columns]], name=y),
+    )
+    if agg == "count":
+        table = table.astype(np.int64)
+    return table
+
+
+def _aggregate(agg: str, cells: np.ndarray, values: np.ndarray, counts: np.ndarray, n_cells: int) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if agg in ("sum", "mean", "std"):
+            sums = np.bincount(cells, weights=values, minlength=n_cells)
+            if agg == "sum":
+                return sums
+            means = sums / counts
+            if agg == "mean":
+                return means
+            # Sample standard deviation from the deviations about each cell's mean
+            squares = np.bincount(cells, weights=(values - means[cells]) ** 2, minlength=n_cells)
+            return np.sqrt(squares / (counts - 1))
+        result = np.full(n_cells, np.inf if agg == "min" else -np.inf)
+        (np.minimum if agg == "min" else np.maximum).at(result, cells, values)
+        return result
+
+
+@lru_cache(maxsize=32)
+def _codes(dataset: Dataset, column: str) -> tuple[np.ndarray, np.ndarray]:
+    # Integer codes and their labels; indexed columns already have them
+    index = dataset.index(column)
+    if index is not None:
+        return index.codes, index.labels
+    codes, uniques = pd.factorize(dataset.column(column))
+    return codes, np.asarray(uniques)
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from bins import category_counts, dataset_category_counts, dataset_histogram, histogram_counts
+from cache import LRUCache
+from dataset import Dataset
+from distributions import group_distributions
+from downsample import lttb, stratified_sample
+from pivot import pivot
+
+# Scatter and line plots with more points than this are reduced before being sent to
+# the browser
+MAX_POINTS = 5000
+
+FIGURE_CACHE_BYTES = 32 * 1024 * 1024
+
+
+def create_plot_figure(data, plot_config, max_points: int = MAX_POINTS):
+    """Helper function to create plot figure from data and config"""
+    plot_type = plot_config["type"]
+    x = plot_config["x"]
+    y = plot_config["y"]
+    z = plot_config["z"]
+
+    if plot_type == "histogram" and x and not _is_numeric(data[x]):
+        return bar_figure(*category_counts(data[x].to_numpy()), x, f"Histogram of {x}")
+    elif plot_type == "histogram" and x:
+        return histogram_figure(*histogram_counts(data[x].to_numpy()), x)
+    elif plot_type == "bar" and x:
+        return bar_figure(*category_counts(data[x].to_numpy()), x)
+    elif plot_type == "scatter" and x and y:
+        title = f"Scatter Plot: {x} vs {y}"
+        if len(data) > max_points:
+            rows = stratified_sample(data[x], data[y], max_points)
+            title += _reduced_note(len(rows), len(data))
+            data = data.iloc[rows]
+        return px.scatter(data, x=x, y=y, title=title)
+    elif plot_type == "box" and x and y:
+        return px.box(data, x=x, y=y, title=f"Box Plot: {y} by {x}")
+    elif plot_type == "line" and x and y:
+        title = f"Line Plot: {x} vs {y}"
+        if len(data) > max_points:
+            data = _lttb_frame(data, x, y, max_points)
+            title += _reduced_note(len(data.attrs["rows"]), data.attrs["total"])
+        return px.line(data, x=x, y=y, title=title)
+    elif plot_type == "violin" and x and y:
+        return px.violin(data, x=x, y=y, title=f"Violin Plot: {y} by {x}")
+    elif plot_type == "heatmap" and x and y and z:
+        # Create pivot table for heatmap
+        agg = plot_config.get("agg") or "mean"
+        pivot_data = data.groupby([x, y])[z].agg(agg).unstack(fill_value=0)
+        return heatmap_figure(pivot_data, x, y, z, agg)
+    else:
+        raise ValueError(f"Invalid plot configuration for {plot_type}.")
+
+
+def build_figure(dataset: Dataset, mask, plot_config, max_points: int = MAX_POINTS):
+    """
+    The figure for `plot_config` over the rows of `dataset` selected by `mask`.
+
+    Figures are memoized process-wide by dataset version, selection, config and point
+    budget. They are shared between sessions, so callers must not modify them.
+    """
+    key = (dataset.version, dataset.selection_key(mask), tuple(sorted(plot_config.items())), max_points)
+    return figure_cache.get_or_compute(key, lambda: _build_figure(dataset, mask, plot_config, max_points))
+
+
+def _build_figure(dataset: Dataset, mask, plot_config, max_points: int):
+    """
+    Histograms and bar charts are counted on the server, box and violin plots are drawn
+    from per-group summaries and heatmaps from a pivot kernel, all cached per selection,
+    so the browser receives bins and statistics rather than rows. Other plots use
+    `create_plot_figure` on the materialized rows.
+    """
+    x = plot_config["x"]
+    y = plot_config["y"]
+    z = plot_config["z"]
+    if plot_config["type"] == "histogram" and x in dataset.columns and not dataset.is_numeric(x):
+        return bar_figure(*dataset_category_counts(dataset, mask, x), x, f"Histogram of {x}")
+    if plot_config["type"] == "histogram" and x:
+        return histogram_figure(*dataset_histogram(dataset, mask, x), x)
+    if plot_config["type"] == "bar" and x:
+        return bar_figure(*dataset_category_counts(dataset, mask, x), x)
+    if plot_config["type"] == "heatmap" and x and y and z:
+        agg = plot_config.get("agg") or "mean"
+        return heatmap_figure(pivot(dataset, mask, x, y, z, agg), x, y, z, agg)
+    if plot_config["type"] in ("box", "violin") and x in dataset.columns and y in dataset.columns:
+        groups = group_distributions(dataset, mask, x, y)
+        if groups is not None:
+            figure = box_figure if plot_config["type"] == "box" else violin_figure
+            return figure(groups, x, y)
+    return create_plot_figure(dataset.take(mask), plot_config, max_points)
+
+
+def figure_signature(figure) -> tuple:
+    """The trace types of a figure; figures with equal signatures can update each other in place."""
+    return tuple(trace.type for trace in figure.data)
+
+
+def update_figure_widget(widget, figure) -> bool:
+    """
+    Copy the traces and layout of `figure` into a rendered `FigureWidget` in one batched
+    update, so only the changed properties are sent to the browser. Returns False,
+    without touching the widget, when the trace types differ.
+    """
+    if figure_signature(widget) != figure_signature(figure):
+        return False
+    with widget.batch_update():
+        for trace, new in zip(widget.data, figure.data):
+            properties = new.to_plotly_json()
+            properties.pop("type", None)
+            properties.pop("uid", None)
+            trace.update(properties, overwrite=True)
+        widget.layout.update(figure.layout.to_plotly_json(), overwrite=True)
+    return True
+
+
+def histogram_figure(edges, counts, x: str):
+    # Bars spanning each bin, so the payload grows with the bins rather than the rows
+    return go.Figure(
+        go.Bar(
+            x=(edges[:-1] + edges[1:]) / 2,
+            y=counts,
+            width=np.diff(edges),
+            customdata=np.column_stack([edges[:-1], edges[1:]]),
+            hovertemplate=f"{x}=%{{customdata[0]:.4g}}–%{{customdata[1]:.4g}}<br>count=%{{y}}<extra></extra>",
+        ),
+        layout={"title": f"Histogram of {x}", "xaxis_title": x, "yaxis_title": "count", "bargap": 0},
+    )
+
+
+def bar_figure(labels, counts, x: str, title: str = None):
+    return go.Figure(
+        go.Bar(x=labels, y=counts),
+        layout={"title": title or f"Bar Chart of {x}", "xaxis_title": x, "yaxis_title": "Count"},
+    )
+
+
+def heatmap_figure(pivot_data, x: str, y: str, z: str, agg: str = "mean"):
+    # Laid out as px.imshow would: x values down the rows, y values across the columns
+    value = z if agg == "mean" else f"{agg} of {z}"
+    return go.Figure(
+        go.Heatmap(
+            z=pivot_data.to_numpy(),
+            x=[str(label) for label in pivot_data.columns],
+            y=[str(label) for label in pivot_data.index],
+            colorbar={"title": value},
+        ),
+        layout={
+            "title": f"Heatmap: {value} by {x} and {y}",
+            "xaxis": {"title": y, "type": "category"},
+            "yaxis": {"title": x, "type": "category", "autorange": "reversed"},
+        },
+    )
+
+
+def box_figure(groups, x: str, y: str):
+    # Precomputed quartiles and fences, plus the (capped) outliers as a separate trace
+    labels = [group.label for group in groups]
+    figure = go.Figure(
+        go.Box(
+            x=labels,
+            q1=[group.q1 for group in groups],
+            median=[group.median for group in groups],
+            q3=[group.q3 for group in groups],
+            lowerfence=[group.lower_fence for group in groups],
+            upperfence=[group.upper_fence for group in groups],
+            name=y,
+            showlegend=False,
+        ),
+        layout={"title": f"Box Plot: {y} by {x}", "xaxis_title": x, "yaxis_title": y},
+    )
+    outliers = [(group.label, value) for group in groups for value in group.outliers]
+    if outliers:
+        outlier_x, outlier_y = zip(*outliers)
+        figure.add_trace(go.Scatter(x=outlier_x, y=outlier_y, mode="markers", name="outliers", showlegend=False))
+    return figure
+
+
+def violin_figure(groups, x: str, y: str):
+    # Each violin is a filled outline of its density, mirrored around the group's slot
+    figure = go.Figure(layout={"title": f"Violin Plot: {y} by {x}", "xaxis_title": x, "yaxis_title": y})
+    for position, group in enumerate(groups):
+        half_width = 0.4 * group.density / group.density.max() if group.density.max() else group.density
+        figure.add_trace(
+            go.Scatter(
+                x=np.concatenate([position - half_width, (position + half_width)[::-1]]),
+                y=np.concatenate([group.grid, group.grid[::-1]]),
+                fill="toself",
+                mode="lines",
+                name=str(group.label),
+                hoverinfo="name",
+            )
+        )
+    # Interquartile bars and medians, as in Plotly's inner box
+    positions = np.arange(len(groups))
+    figure.add_trace(
+        go.Scatter(
+            x=np.repeat(positions, 3),
+            y=[value for group in groups for value in (group.q1, group.q3, None)],
+            mode="lines",
+            line={"color": "black", "width": 4},
+            hoverinfo="skip",
+            showlegend=False,
+        )
+    )
+    figure.add_trace(
+        go.Scatter(
+            x=positions,
+            y=[group.median for group in groups],
+            mode="markers",
+            marker={"color": "white", "line": {"color": "black", "width": 1}},
+            name="median",
+            showlegend=False,
+        )
+    )
+    figure.update_xaxes(tickvals=positions, ticktext=[str(group.label) for group in groups])
+    return figure
+
+
+def _figure_nbytes(figure) -> int:
+    # Arrays dominate a figure's size; everything else is a small constant
+    nbytes = 4096
+    for trace in figure.data:
+        for value in trace.to_plotly_json().values():
+            if isinstance(value, (list, tuple, np.ndarray)):
+                nbytes += np.asarray(value, dtype=object).size * 16
+    return nbytes
+
+
+figure_cache = LRUCache(FIGURE_CACHE_BYTES, size=_figure_nbytes)
+
+
+def _lttb_frame(data: pd.DataFrame, x: str, y: str, max_points: int) -> pd.DataFrame:
+    # LTTB needs the points in x order; a non-numeric x is placed by its position
+    total = len(data)
+    frame = data[[x, y]].dropna().sort_values(x, kind="stable")
+    xs = frame[x].to_numpy(dtype=float) if _is_numeric(frame[x]) else np.arange(len(frame), dtype=float)
+    rows = lttb(xs, frame[y].to_numpy(dtype=float), max_points)
+    reduced = frame.iloc[rows]
+    reduced.attrs.update(rows=rows, total=total)
+    return reduced
+
+
+def _is_numeric(values: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+
+
+def _reduced_note(shown: int, total: int) -> str:
+    return f" (showing {shown:,} of {total:,} points)"
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
 from pathlib import Path
+from typing import Optional
 
+import numpy as np
 import pandas as pd
 
+from columnar import read_csv_cached
+from dataset import INDEX_MAX_CARDINALITY, Dataset, fingerprint
+
 # Available models:
 #
 # gpt-4o-mini (recommended)
@@ -17,56 +22,119 @@ import pandas as pd
 default_model = "o3-mini"
 
 
-def system_prompt(df: pd.DataFrame, name: str, categorical_threshold: int = 10) -> str:
-    schema = df_to_schema(df, name, categorical_threshold)
-    with open(Path(__file__).parent / "prompt.md", "r") as f:
-        rendered_prompt = f.read().replace("${SCHEMA}", schema)
-        return rendered_prompt
+# Text columns are scanned for distinct values this many rows at a time, stopping
+# as soon as they have too many to be categorical
+DISTINCT_CHUNK_ROWS = 100_000
+
+_prompt_cache: dict[tuple, str] = {}
+
 
+def system_prompt(data: Dataset | pd.DataFrame, name: str, categorical_threshold: int = 10) -> str:
+    """
+    `prompt.md` with the schema of `data` filled in.
 
-def df_to_schema(df: pd.DataFrame, name: str, categorical_threshold: int):
+    Rendered prompts are cached by template modification time, dataset fingerprint,
+    table name and threshold, so later sessions only pay for a `stat()` of the template.
+    A `Dataset` already carries its fingerprint and category labels; a plain DataFrame
+    is hashed once per call.
+    """
+    template = Path(__file__).parent / "prompt.md"
+    version = data.version if isinstance(data, Dataset) else fingerprint(data)
+    key = (template.stat().st_mtime_ns, version, name, categorical_threshold)
+    prompt = _prompt_cache.get(key)
+    if prompt is None:
+        schema = df_to_schema(data, name, categorical_threshold)
+        prompt = template.read_text().replace("${SCHEMA}", schema)
+        _prompt_cache.clear()
+        _prompt_cache[key] = prompt
+    return prompt
+
+
+def df_to_schema(data: Dataset | pd.DataFrame, name: str, categorical_threshold: int):
     schema = []
     schema.append(f"Table: {name}")
     schema.append("Columns:")
 
-    for column, dtype in df.dtypes.items():
-        # Map pandas dtypes to SQL-like types
-        if pd.api.types.is_integer_dtype(dtype):
-            sql_type = "INTEGER"
-        elif pd.api.types.is_float_dtype(dtype):
-            sql_type = "FLOAT"
-        elif pd.api.types.is_bool_dtype(dtype):
-            sql_type = "BOOLEAN"
-        elif pd.api.types.is_datetime64_any_dtype(dtype):
-            sql_type = "DATETIME"
-        else:
-            sql_type = "TEXT"
-
+    stats = column_stats(data, categorical_threshold)
+    for column, (sql_type, detail) in stats.items():
         schema.append(f"- {column} ({sql_type})")
-
-        # For TEXT columns, check if they're categorical
-        if sql_type == "TEXT":
-            unique_values = df[column].nunique()
-            if unique_values <= categorical_threshold:
-                categories = df[column].unique().tolist()
-                categories_str = ", ".join(f"'{cat}'" for cat in categories)
-                schema.append(f"  Categorical values: {categories_str}")
-        # For FLOAT and INTEGER columns, add the range
+        # TEXT columns list their values when they are categorical, numbers their range
+        if sql_type == "TEXT" and detail is not None:
+            categories_str = ", ".join(f"'{cat}'" for cat in detail)
+            schema.append(f"  Categorical values: {categories_str}")
         elif sql_type in ["INTEGER", "FLOAT"]:
-            min_val = df[column].min()
-            max_val = df[column].max()
+            min_val, max_val = detail
             schema.append(f"  Range: {min_val} to {max_val}")
 
     return "\n".join(schema)
 
 
-# Data directory
-here = Path(__file__).parent
-tips = pd.read_csv(here / "tips.csv")
-# tips["percent"] = tips.tip / tips.total_bill
-df = pd.DataFrame(tips)
-
-
-text = system_prompt(df, "Demo data")
-
-print(text)
\ No newline at end of file
+def column_stats(data: Dataset | pd.DataFrame, categorical_threshold: int) -> dict[str, tuple[str, object]]:
+    """
+    The SQL type of every column with its range (numbers) or categories (text, None
+    when there are more than `categorical_threshold`).
+
+    The ranges of all numeric columns come from one `agg(["min", "max"])` over their
+    blocks. Text columns are categorical if the dataset indexed them; otherwise their
+    distinct values are collected chunk by chunk, stopping at the first chunk that
+    takes them past the threshold, so high-cardinality columns cost one chunk and
+    never build a full hash table.
+    """
+    dataset = data if isinstance(data, Dataset) else None
+    df = data.frame if dataset is not None else data
+
+    types = {column: _sql_type(dtype) for column, dtype in df.dtypes.items()}
+    numeric = [column for column, sql_type in types.items() if sql_type in ("INTEGER", "FLOAT")]
+    ranges = df[numeric].agg(["min", "max"]) if numeric else None
+
+    stats = {}
+    for column, sql_type in types.items():
+        if sql_type in ("INTEGER", "FLOAT"):
+            stats[column] = (sql_type, (ranges.at["min", column], ranges.at["max", column]))
+        elif sql_type == "TEXT":
+            stats[column] = (sql_type, _categories(df, dataset, column, categorical_threshold))
+        else:
+            stats[column] = (sql_type, None)
+    return stats
+
+
+def _sql_type(dtype) -> str:
+    # Map pandas dtypes to SQL-like types
+    if pd.api.types.is_bool_dtype(dtype):
+        return "BOOLEAN"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "FLOAT"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "DATETIME"
+    return "TEXT"
+
+
+def _categories(df: pd.DataFrame, dataset: Optional[Dataset], column: str, threshold: int) -> Optional[list]:
+    if dataset is not None and threshold <= INDEX_MAX_CARDINALITY:
+        # Indexed columns have their distinct values already; unindexed ones have too many
+        index = dataset.index(column)
+        if index is None:
+            return None
+        labels = [label for label in index.labels.tolist() if not pd.isna(label)]
+        return labels if len(labels) <= threshold else None
+
+    uniques: list = []
+    series = df[column]
+    for start in range(0, len(series), DISTINCT_CHUNK_ROWS):
+        chunk = series.iloc[start:start + DISTINCT_CHUNK_ROWS].unique()
+        uniques = pd.unique(np.asarray([*uniques, *chunk], dtype=object)).tolist()
+        if pd.notna(uniques).sum() > threshold:
+            return None
+    return uniques
+
+
+if __name__ == "__main__":
+    # Data directory
+    here = Path(__file__).parent
+    df = read_csv_cached(here / "tips.csv")
+
+    text = system_prompt(df, "Demo data")
+
+    print(text)
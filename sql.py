@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from typing import Optional
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from cache import LRUCache
+from dataset import Dataset
+
+# Row ids of the shared dataset, carried through a dashboard query's `SELECT *` so it can
+# be turned back into a row mask. Queries never see them: the view they read leaves them
+# out, and only `filter_mask()` reads the table that has them.
+ROW_ID = "__row_id"
+
+# Results of recent queries, shared by every session; the dataset is read-only, so a
+# query's result only changes with the dataset version
+SQL_CACHE_BYTES = 64 * 1024 * 1024
+sql_cache = LRUCache(SQL_CACHE_BYTES)
+
+
+# Defaults for SQL_TIMEOUT (seconds a query may run before it is interrupted),
+# SQL_MAX_ROWS (rows a question may return), SQL_MAX_PLAN_ROWS (estimated rows flowing
+# through a plan before it is rejected unexecuted), SQL_MEMORY_LIMIT and SQL_THREADS
+# (DuckDB's limits for the whole process). They are read when the first session starts,
+# after the app has loaded its .env file.
+QUERY_TIMEOUT = 10.0
+MAX_RESULT_ROWS = 10_000
+MAX_PLAN_ROWS = 1_000_000_000
+MEMORY_LIMIT = "1GB"
+
+# Operators whose output can be every pair of their inputs' rows; DuckDB gives them no
+# estimate, so they are costed at the product of their children
+_PAIRWISE_OPERATORS = {"CROSS_PRODUCT", "NESTED_LOOP_JOIN", "BLOCKWISE_NL_JOIN", "PIECEWISE_MERGE_JOIN"}
+
+
+class SqlError(ValueError):
+    """
+    Raised when a SQL query fails or cannot be used the way it was asked for.
+
+    `code` says which check failed ("invalid", "too_costly", "timeout", "too_many_rows"
+    or "error"), so the model can be told what to change when it retries.
+    """
+
+    def __init__(self, message: str, code: str = "error", **details):
+        super().__init__(message)
+        self.code = code
+        self.details = details
+
+    def to_json(self) -> str:
+        return json.dumps({"error": self.code, "message": str(self), **self.details}, default=str)
+
+
+class QueryLimits:
+    """The resources one SQL query may use, and the process-wide DuckDB limits."""
+
+    def __init__(
+        self,
+        timeout: float = QUERY_TIMEOUT,
+        max_rows: int = MAX_RESULT_ROWS,
+        max_plan_rows: float = MAX_PLAN_ROWS,
+        memory_limit: str = MEMORY_LIMIT,
+        threads: Optional[int] = None,
+    ):
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self.max_plan_rows = max_plan_rows
+        self.memory_limit = memory_limit
+        self.threads = threads
+
+    @classmethod
+    def from_env(cls) -> "QueryLimits":
+        threads = os.environ.get("SQL_THREADS")
+        return cls(
+            timeout=float(os.environ.get("SQL_TIMEOUT", QUERY_TIMEOUT)),
+            max_rows=int(os.environ.get("SQL_MAX_ROWS", MAX_RESULT_ROWS)),
+            max_plan_rows=float(os.environ.get("SQL_MAX_PLAN_ROWS", MAX_PLAN_ROWS)),
+            memory_limit=os.environ.get("SQL_MEMORY_LIMIT", MEMORY_LIMIT),
+            threads=int(threads) if threads else None,
+        )
+
+
+class SqlEngine:
+    """
+    A process-wide in-memory DuckDB database over the shared dataset.
+
+    The dataset is handed to DuckDB once as an Arrow table (numeric columns without
+    copying) with a row-id column, under `rows_table`. Queries read it through a view
+    named after the dataset that leaves the row ids out, and may not name the table
+    itself, so they run on DuckDB's columnar, multi-threaded engine without seeing
+    anything but the dataset. Sessions each get their own cursor from `session()`.
+
+    Every query runs under `limits` (from the environment unless given): DuckDB's
+    memory and thread limits bound the whole process, and each session enforces the
+    per-query plan cost, deadline and row cap.
+    """
+
+    def __init__(self, dataset: Dataset, limits: Optional[QueryLimits] = None):
+        self.dataset = dataset
+        self.table = dataset.name
+        self.rows_table = f"{dataset.name}_rows"
+        self.limits = limits
+        self.connection = duckdb.connect(":memory:")
+        self.connection.execute("SET allow_community_extensions = false")
+        if limits is not None:
+            self._apply_limits()
+
+        rows = pa.Table.from_pandas(dataset.frame, preserve_index=False)
+        rows = rows.append_column(ROW_ID, pa.array(np.arange(dataset.n_rows, dtype=np.int64)))
+        self.rows = rows
+        # Queries may only read the dataset, never files or the network
+        self.connection.execute("SET enable_external_access = false")
+        self._lock = threading.Lock()
+
+    def session(self) -> "SqlSession":
+        """A cursor of its own over the shared database, for one session."""
+        with self._lock:
+            if self.limits is None:
+                self.limits = QueryLimits.from_env()
+                self._apply_limits()
+            cursor = self.connection.cursor()
+        # Registered tables are local to a cursor, but registering only stores a
+        # reference: every cursor scans the same Arrow buffers in place
+        cursor.register(self.rows_table, self.rows)
+        cursor.execute(f'CREATE TEMP VIEW "{self.table}" AS SELECT * EXCLUDE ("{ROW_ID}") FROM "{self.rows_table}"')
+        return SqlSession(self, cursor)
+
+    def _apply_limits(self):
+        self.connection.execute("SET memory_limit = ?", [self.limits.memory_limit])
+        if self.limits.threads:
+            self.connection.execute(f"SET threads = {int(self.limits.threads)}")
+
+
+class SqlSession:
+    """
+    One session's cursor on the shared `SqlEngine`.
+
+    Every distinct query text is prepared once per cursor and executed by name after
+    that. Results come back as Arrow tables and are converted to pandas without copying
+    numeric columns; they are also cached process-wide, so other sessions asking the
+    same question skip execution entirely.
+
+    Before a query runs, its plan is costed with EXPLAIN and rejected if too many rows
+    would flow through it. While it runs, a timer interrupts it at the deadline, and it
+    is cut off one row past its cap. The calls block, so run them in a worker thread.
+    """
+
+    def __init__(self, engine: SqlEngine, cursor):
+        self.engine = engine
+        self.cursor = cursor
+        self._prepared: dict[str, str] = {}
+
+    @property
+    def limits(self) -> QueryLimits:
+        return self.engine.limits
+
+    def arrow(self, sql: str, max_rows: Optional[int] = None) -> pa.Table:
+        """
+        The result of a query as a read-only Arrow table.
+
+        Raises `SqlError` with code "too_many_rows" if it has more than `max_rows` rows
+        (the configured result cap by default).
+        """
+        return self._fetch(self._validate(sql), max_rows)
+
+    def _fetch(self, sql: str, max_rows: Optional[int] = None) -> pa.Table:
+        max_rows = self.limits.max_rows if max_rows is None else max_rows
+        # Asking for one row past the cap tells an oversized result from one that fits
+        capped = f"SELECT * FROM ({sql}) LIMIT {max_rows + 1}"
+        key = (self.engine.dataset.version, capped)
+        table = sql_cache.get_or_compute(key, lambda: self._execute(sql, capped))
+        if table.num_rows > max_rows:
+            raise SqlError(
+                f"The query returned more than {max_rows:,} rows; aggregate or add a LIMIT.",
+                "too_many_rows",
+                max_rows=max_rows,
+            )
+        return table
+
+    def query(self, sql: str) -> pd.DataFrame:
+        """The result of a query as a DataFrame."""
+        return self.arrow(sql).to_pandas(split_blocks=True)
+
+    def filter_mask(self, sql: str) -> np.ndarray:
+        """
+        The row mask of the shared dataset selected by a dashboard query.
+
+        The query must return every column of the table (`SELECT * ...`); the rows it
+        returns, wherever they came from in the query, select the matching dataset rows.
+        It may return at most as many rows as the table has.
+        """
+        # The query reads the table with row ids in place of the view, and only the row
+        # ids of its result are fetched
+        with_rows = f'WITH "{self.engine.table}" AS (SELECT * FROM "{self.engine.rows_table}")'
+        sql = self._validate(sql)
+        try:
+            columns = {row[0] for row in self.cursor.execute(f"DESCRIBE {with_rows} SELECT * FROM ({sql})").fetchall()}
+        except duckdb.Error as e:
+            raise SqlError(f"Error in SQL query: {e}", "invalid") from e
+        if not {ROW_ID, *self.engine.dataset.columns} <= columns:
+            raise SqlError("Dashboard queries must return every column of the table; use SELECT *.", "invalid")
+        table = self._fetch(f'{with_rows} SELECT "{ROW_ID}" FROM ({sql})', self.engine.dataset.n_rows)
+        mask = np.zeros(self.engine.dataset.n_rows, dtype=bool)
+        mask[table.column(ROW_ID).to_numpy()] = True
+        mask.flags.writeable = False
+        return mask
+
+    def _validate(self, sql: str) -> str:
+        sql = validate_sql(sql)
+        # The table behind the view is internal; only the view may be queried
+        if self.engine.rows_table.lower() in {name.lower() for name in duckdb.get_table_names(sql)}:
+            raise SqlError(f'Unknown table "{self.engine.rows_table}"; query "{self.engine.table}".', "invalid")
+        return sql
+
+    def plan_rows(self, sql: str) -> float:
+        """Estimated rows flowing through every operator of the query's plan, summed."""
+        try:
+            plan = self.cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}").fetchall()[0][1]
+        except duckdb.Error as e:
+            raise SqlError(f"Error in SQL query: {e}", "invalid") from e
+        return sum(_plan_rows(operator, self.engine.dataset.n_rows)[1] for operator in json.loads(plan))
+
+    def _execute(self, sql: str, capped: str) -> pa.Table:
+        estimate = self.plan_rows(sql)
+        if estimate > self.limits.max_plan_rows:
+            raise SqlError(
+                f"The query is too expensive to run (about {estimate:,.0f} rows processed); "
+                "avoid cross joins and unbounded windows, or filter earlier.",
+                "too_costly",
+                estimated_rows=estimate,
+                max_plan_rows=self.limits.max_plan_rows,
+            )
+
+        timer = threading.Timer(self.limits.timeout, self.cursor.interrupt)
+        timer.start()
+        try:
+            name = self._prepared.get(capped)
+            if name is None:
+                name = f"q{len(self._prepared)}"
+                self.cursor.execute(f"PREPARE {name} AS {capped}")
+                self._prepared[capped] = name
+            return self.cursor.execute(f"EXECUTE {name}").fetch_arrow_table()
+        except duckdb.InterruptException as e:
+            raise SqlError(
+                f"The query was cancelled after {self.limits.timeout:g} seconds; write a cheaper query.",
+                "timeout",
+                timeout_s=self.limits.timeout,
+            ) from e
+        except duckdb.OutOfMemoryException as e:
+            raise SqlError(f"The query ran out of memory: {e}", "too_costly") from e
+        except duckdb.Error as e:
+            raise SqlError(f"Error in SQL query: {e}") from e
+        finally:
+            timer.cancel()
+
+    def close(self):
+        # Stops a query still running for a session that has ended
+        self.cursor.interrupt()
+        self.cursor.close()
+
+
+def retry_prompt(errors: list[SqlError]) -> str:
+    """The message that reports failed queries back to the model so it can try again."""
+    details = "\n".join(error.to_json() for error in errors)
+    return (
+        "These SQL commands from your last reply failed:\n"
+        f"{details}\n"
+        "Reply with corrected commands if a cheaper or valid query can answer the request; "
+        "otherwise explain the problem to the user."
+    )
+
+
+def _plan_rows(operator: dict, table_rows: int) -> tuple[float, float]:
+    # An upper bound on the operator's output rows, and the rows of its whole subtree.
+    # DuckDB's own estimates are unreliable for scans of registered Arrow data, so scans
+    # count as the full table and other estimates are only trusted above the inputs.
+    children = [_plan_rows(child, table_rows) for child in operator.get("children", [])]
+    name = operator.get("name", "")
+    info = operator.get("extra_info", {})
+    estimate = float(info.get("Estimated Cardinality", 0) or 0)
+    inputs = [output for output, _ in children]
+    if info.get("Function") == "ARROW_SCAN":
+        rows = max(estimate, table_rows)
+    elif name in _PAIRWISE_OPERATORS:
+        rows = float(np.prod(inputs))
+    elif name == "UNGROUPED_AGGREGATE":
+        rows = 1.0
+    elif not children:
+        rows = max(estimate, 1.0)
+    else:
+        rows = max(estimate, *inputs)
+    return rows, rows + sum(total for _, total in children)
+
+
+def markdown_table(frame: pd.DataFrame, max_rows: int = 10) -> str:
+    """A query result as a Markdown table; longer results show their first 5 rows."""
+    shown = frame if len(frame) <= max_rows else frame.head(5)
+    lines = [
+        "| " + " | ".join(str(column) for column in frame.columns) + " |",
+        "|" + "|".join("---:" if pd.api.types.is_numeric_dtype(dtype) else "---" for dtype in frame.dtypes) + "|",
+    ]
+    for row in shown.itertuples(index=False):
+        lines.append("| " + " | ".join(_cell(value) for value in row) + " |")
+    if len(shown) < len(frame):
+        lines.append(f"\n({len(frame):,} rows, first {len(shown)} shown)")
+    return "\n".join(lines)
+
+
+def _cell(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value).replace("|", "\\|")
+
+
+def validate_sql(sql: str) -> str:
+    """The query with wrapping backticks and semicolons removed, if it is one valid SELECT."""
+    sql = sql.strip().rstrip(";").strip()
+    # Models often wrap the query in backticks
+    while len(sql) > 1 and sql[0] == sql[-1] == "`":
+        sql = sql[1:-1].strip().rstrip(";").strip()
+    if not sql:
+        raise SqlError("Empty SQL query.", "invalid")
+    try:
+        statements = duckdb.extract_statements(sql)
+    except duckdb.Error as e:
+        raise SqlError(f"Error in SQL query: {e}", "invalid") from e
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        raise SqlError("Only a single SELECT query can be run against the dataset.", "invalid")
+    return sql
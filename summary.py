@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import math
+from typing import Optional
+
+import numpy as np
+
+from dataset import Dataset
+
+
+class Metric:
+    """A value box: its title and icon, and how to reduce the filtered rows to one number."""
+
+    def __init__(self, title: str, icon: str, agg: str, column: Optional[str] = None, fmt: str = "{}"):
+        if agg not in ("count", "sum", "mean"):
+            raise ValueError(f"Unsupported summary aggregation '{agg}'.")
+        self.title = title
+        self.icon = icon
+        self.agg = agg
+        self.column = column
+        self.fmt = fmt
+
+    def format(self, value: float) -> str:
+        return self.fmt.format(value)
+
+
+# Adding a value box only takes a new entry here; it joins the shared pass below
+METRICS = {
+    "total_tippers": Metric("Total tippers", "user", "count"),
+    "total_bill": Metric("Total bill", "dollar-sign", "sum", "total_bill", "${:,.2f}"),
+    "average_tip_percentage": Metric("Average tip percentage", "percent", "mean", "percent", "{:.2%}"),
+    "average_bill": Metric("Average bill", "dollar-sign", "mean", "total_bill", "${:,.2f}"),
+}
+
+
+def summarize(dataset: Dataset, mask: Optional[np.ndarray], metrics: dict[str, Metric] = METRICS) -> dict[str, float]:
+    """
+    Compute every metric for one filter state, reducing each column they use once.
+
+    Float columns are reduced in place over the shared, read-only arrays, skipping NaNs
+    and unselected rows through a `where=` mask, so no copy of the data is kept.
+    """
+    count = dataset.count(mask)
+    sums, valid = {}, {}
+    for column in {m.column for m in metrics.values() if m.column}:
+        values = dataset.column(column).astype(float, copy=False)
+        where = ~np.isnan(values)
+        if mask is not None:
+            where &= mask
+        sums[column] = np.add.reduce(values, where=where)
+        valid[column] = int(np.count_nonzero(where))
+
+    results = {}
+    for name, metric in metrics.items():
+        if metric.agg == "count":
+            results[name] = count
+        elif metric.agg == "sum":
+            results[name] = float(sums[metric.column])
+        else:
+            n = valid[metric.column]
+            results[name] = float(sums[metric.column] / n) if n else math.nan
+    return results
+
@@ -0,0 +1,79 @@
+"""
+Synthetic tips data at any scale, with the category skew of the real dataset.
+
+    python synth.py --rows 1000000 --out tips_1m.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# (value, probability) pairs, roughly following the original tips data
+DAYS = (("Sat", 0.36), ("Sun", 0.31), ("Thur", 0.25), ("Fri", 0.08))
+LUNCH_SHARE = {"Sat": 0.0, "Sun": 0.0, "Thur": 0.95, "Fri": 0.37}
+SIZES = ((1, 0.02), (2, 0.64), (3, 0.15), (4, 0.15), (5, 0.02), (6, 0.02))
+MALE_SHARE = 0.64
+SMOKER_SHARE = 0.38
+CHUNK_ROWS = 5_000_000
+
+
+def generate_tips(n_rows: int, seed: int = 0, with_percent: bool = False) -> pd.DataFrame:
+    """
+    A tips-shaped DataFrame of `n_rows` rows.
+
+    Days, party sizes, sex and smoker follow the skew of the original data, lunch is
+    mostly on Thursdays, bills grow with party size (log-normally) and tips are a noisy
+    percentage of the bill. Rows are generated in chunks to bound peak memory.
+    """
+    rng = np.random.default_rng(seed)
+    chunks = [_chunk(rng, min(CHUNK_ROWS, n_rows - start)) for start in range(0, n_rows, CHUNK_ROWS)]
+    frame = pd.concat(chunks, ignore_index=True) if chunks else _chunk(rng, 0)
+    if with_percent:
+        frame["percent"] = frame.tip / frame.total_bill
+    return frame
+
+
+def _chunk(rng: np.random.Generator, n: int) -> pd.DataFrame:
+    days = _choice(rng, DAYS, n)
+    lunch = rng.random(n) < pd.Series(days).map(LUNCH_SHARE).to_numpy()
+    size = _choice(rng, SIZES, n).astype(np.int64)
+    total_bill = np.round(rng.lognormal(np.log(7.5 + 5.5 * size), 0.35), 2).clip(3.0, None)
+    percent = rng.normal(0.16, 0.05, n).clip(0.03, 0.7)
+    # Smokers tip less consistently
+    smoker = rng.random(n) < SMOKER_SHARE
+    percent = np.where(smoker, percent + rng.normal(0, 0.03, n), percent).clip(0.01, 0.7)
+    tip = np.round(np.maximum(total_bill * percent, 1.0), 2)
+    return pd.DataFrame(
+        {
+            "total_bill": total_bill,
+            "tip": tip,
+            "sex": np.where(rng.random(n) < MALE_SHARE, "Male", "Female").astype(object),
+            "smoker": np.where(smoker, "Yes", "No").astype(object),
+            "day": days.astype(object),
+            "time": np.where(lunch, "Lunch", "Dinner").astype(object),
+            "size": size,
+        }
+    )
+
+
+def _choice(rng: np.random.Generator, weighted: tuple, n: int) -> np.ndarray:
+    values, probabilities = zip(*weighted)
+    probabilities = np.array(probabilities) / sum(probabilities)
+    return np.array(values)[rng.choice(len(values), size=n, p=probabilities)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, required=True, help="CSV file to write")
+    args = parser.parse_args()
+    generate_tips(args.rows, args.seed).to_csv(args.out, index=False)
+
+
+if __name__ == "__main__":
+    main()
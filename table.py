@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from dataset import Dataset
+
+# Rows sent to the browser per page of the data table
+PAGE_SIZE = 50
+
+# Ordered row ids of recent (selection, sort) pairs, shared by every session so paging
+# through a table only slices them
+ROW_CACHE_BYTES = 64 * 1024 * 1024
+row_cache = LRUCache(ROW_CACHE_BYTES)
+
+
+class TablePage(NamedTuple):
+    """One window of the data table and where it sits in the full selection."""
+
+    frame: pd.DataFrame
+    offset: int
+    total: int
+
+    @property
+    def n_pages(self) -> int:
+        return max(1, -(-self.total // PAGE_SIZE))
+
+
+def table_page(
+    dataset: Dataset,
+    mask: Optional[np.ndarray],
+    page: int = 1,
+    sort: Optional[str] = None,
+    descending: bool = False,
+    page_size: int = PAGE_SIZE,
+) -> TablePage:
+    """
+    The rows of page `page` (1-based) of the selection, optionally sorted by a column.
+
+    Only the rows of the page are materialized. The ordered row ids of the selection are
+    cached per selection and sort order, so turning pages costs a slice plus the rows
+    shown, whatever the size of the dataset. Missing values sort last either way.
+    """
+    rows = selected_rows(dataset, mask, sort, descending)
+    offset = min(max(int(page) - 1, 0) * page_size, max(len(rows) - 1, 0) // page_size * page_size)
+    window = rows[offset:offset + page_size]
+    return TablePage(dataset.frame.iloc[window], offset, len(rows))
+
+
+def selected_rows(
+    dataset: Dataset, mask: Optional[np.ndarray], sort: Optional[str] = None, descending: bool = False
+) -> np.ndarray:
+    """Row ids of the selection in display order, cached per selection and sort order."""
+    key = (dataset.version, dataset.selection_key(mask), sort, descending)
+    return row_cache.get_or_compute(key, lambda: _selected_rows(dataset, mask, sort, descending))
+
+
+def _selected_rows(dataset: Dataset, mask: Optional[np.ndarray], sort: Optional[str], descending: bool) -> np.ndarray:
+    if sort is None:
+        rows = np.arange(dataset.n_rows) if mask is None else np.flatnonzero(mask)
+    else:
+        order, n_valid = _sort_order(dataset, sort)
+        if descending:
+            order = np.concatenate([order[:n_valid][::-1], order[n_valid:]])
+        rows = order if mask is None else order[mask[order]]
+    rows.flags.writeable = False
+    return rows
+
+
+@lru_cache(maxsize=32)
+def _sort_order(dataset: Dataset, column: str) -> tuple[np.ndarray, int]:
+    # Row ids in ascending order of `column` with missing values last, and how many
+    # rows have a value; range-indexed columns already carry their order
+    index = dataset.sorted_index(column)
+    if index is not None:
+        return index.order, index.n_valid
+    codes, _ = pd.factorize(dataset.column(column), sort=True)
+    order = np.argsort(np.where(codes < 0, len(codes), codes), kind="stable")
+    return order, int(np.count_nonzero(codes >= 0))
@@ -0,0 +1,29 @@
+import os
+
+import pandas as pd
+
+from columnar import read_csv_cached
+
+
+def with_double(frame: pd.DataFrame) -> pd.DataFrame:
+    return frame.assign(double=frame.x * 2)
+
+
+def test_prunes_only_older_versions_of_the_same_source(tmp_path):
+    cache_dir = tmp_path / "cache"
+    for folder in ("a", "b"):
+        (tmp_path / folder).mkdir()
+        pd.DataFrame({"x": [1, 2, 3]}).to_csv(tmp_path / folder / "data.csv", index=False)
+    source = tmp_path / "a" / "data.csv"
+
+    read_csv_cached(source, cache_dir=cache_dir)
+    read_csv_cached(source, with_double, cache_dir=cache_dir)
+    read_csv_cached(tmp_path / "b" / "data.csv", cache_dir=cache_dir)
+    files = set(os.listdir(cache_dir))
+    assert len(files) == 3
+
+    pd.DataFrame({"x": [4, 5]}).to_csv(source, index=False)
+    assert read_csv_cached(source, cache_dir=cache_dir).x.tolist() == [4, 5]
+    updated = set(os.listdir(cache_dir))
+    assert len(updated) == 3
+    assert len(files - updated) == 1
@@ -0,0 +1,23 @@
+from commands import Command, CommandParser
+
+PARSER = CommandParser({"data table": "data_table"})
+
+
+def test_sql_argument_runs_to_end_of_line():
+    assert PARSER.parse("sql query: SELECT 'hide plot' AS x FROM tips") == [
+        Command("sql_query", None, "SELECT 'hide plot' AS x FROM tips")
+    ]
+
+
+def test_commands_after_sql_line_still_parse():
+    assert PARSER.parse("sql filter: SELECT * FROM tips WHERE day = 'Sun' and hide plot\nshow data table") == [
+        Command("sql_filter", None, "SELECT * FROM tips WHERE day = 'Sun' and hide plot"),
+        Command("show", "data_table"),
+    ]
+
+
+def test_other_arguments_stop_at_next_command():
+    assert PARSER.parse("filter: tip > 2 and hide plot") == [
+        Command("filter", None, "tip > 2"),
+        Command("hide_plot"),
+    ]
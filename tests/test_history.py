@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip("chatlas")
+
+from chatlas import Turn
+
+from commands import CommandParser
+from history import SUMMARY_PREFIX, HistoryManager, _tokens
+
+PARSER = CommandParser({"data table": "data_table"})
+
+
+def summary(lines: list[str]) -> list[Turn]:
+    return [Turn("user", f"{SUMMARY_PREFIX}\n" + "\n".join(lines)), Turn("assistant", "Understood.")]
+
+
+def test_rejects_keeping_no_turns():
+    with pytest.raises(ValueError):
+        HistoryManager(PARSER, keep_turns=0)
+
+
+def test_summary_alone_over_budget_is_cut():
+    state = [f"- Element column {i}: {' '.join(['hidden'] * 20)}" for i in range(20)]
+    manager = HistoryManager(PARSER, max_tokens=100)
+
+    trimmed = manager.trim(summary(["- User asked: an old question"] + state))
+
+    assert trimmed is not None
+    assert _tokens([trimmed]) <= 100
+    # The newest state lines survive
+    assert state[-1] in trimmed[0].text
+    assert manager.trim(trimmed) is None
+
+
+def test_trim_fits_budget_with_summary():
+    turns = []
+    for i in range(10):
+        turns += [Turn("user", f"question {i} " + "x" * 200), Turn("assistant", "filter: tip > 1\n" + "y" * 200)]
+    manager = HistoryManager(PARSER, max_tokens=300, keep_turns=3)
+
+    trimmed = manager.trim(turns)
+
+    assert _tokens([trimmed]) <= 300
+    assert trimmed[0].text.startswith(SUMMARY_PREFIX)
+    assert trimmed[-1] is turns[-1]
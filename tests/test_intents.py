@@ -0,0 +1,45 @@
+import pytest
+
+from commands import CommandParser
+from intents import IntentRouter
+from summary import METRICS
+
+ELEMENTS = {"data table": "data_table", **{key.replace("_", " "): key for key in METRICS}}
+COLUMNS = ["total_bill", "tip", "sex", "smoker", "day", "time", "size", "percent"]
+
+
+@pytest.fixture(scope="module")
+def router():
+    return IntentRouter(CommandParser(ELEMENTS), COLUMNS)
+
+
+@pytest.mark.parametrize(
+    "text, command",
+    [
+        ("show total tippers", "show total tippers"),
+        ("please show me the data table", "show data table"),
+        ("show total bil", "show total bill"),
+        ("hide avrage bill", "hide average bill"),
+        ("show average tip percantage", "show average tip percentage"),
+        ("show all", "show everything"),
+        ("filter: sex = male", "filter: sex = male"),
+    ],
+)
+def test_routes_commands(router, text, command):
+    assert router.route(text) == command
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "show total tip",
+        "show total tips",
+        "show total tipper amount",
+        "shwo data table",
+        "show average tip percentage by day",
+        "plot box: tip by weekday",
+        "filter: sex = = male",
+    ],
+)
+def test_near_misses_go_to_the_model(router, text):
+    assert router.route(text) is None
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset import Dataset
+from pivot import pivot
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    rng = np.random.default_rng(0)
+    n = 200_000
+    frame = pd.DataFrame({
+        "total_bill": np.round(rng.lognormal(3, 0.4, n), 2),
+        "percent": rng.random(n),
+        "day": rng.choice(["Sat", "Sun", "Thur", "Fri"], n),
+        "tip": rng.random(n) * 10,
+    })
+    return Dataset(frame, version="test")
+
+
+@pytest.mark.parametrize("agg", ["mean", "sum", "count", "max"])
+def test_matches_groupby(dataset, agg):
+    mask = dataset.column("day") == "Sun"
+    expected = dataset.take(mask).groupby(["day", "total_bill"])["tip"].agg(agg).unstack(fill_value=0)
+    pd.testing.assert_frame_equal(pivot(dataset, mask, "day", "total_bill", "tip", agg), expected, check_dtype=False)
+
+
+def test_high_cardinality_selection(dataset):
+    mask = np.zeros(dataset.n_rows, dtype=bool)
+    mask[::100] = True
+    expected = dataset.take(mask).groupby(["total_bill", "percent"])["tip"].mean().unstack(fill_value=0)
+    pd.testing.assert_frame_equal(pivot(dataset, mask, "total_bill", "percent", "tip"), expected)
+
+
+def test_too_many_cells(dataset):
+    with pytest.raises(ValueError):
+        pivot(dataset, None, "total_bill", "percent", "tip")
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset import Dataset
+from sql import ROW_ID, QueryLimits, SqlEngine, SqlError
+
+
+@pytest.fixture(scope="module")
+def session():
+    frame = pd.DataFrame({"total_bill": [10.0, 20.0, 30.0, 40.0], "day": ["Sun", "Sat", "Sun", "Thur"]})
+    return SqlEngine(Dataset(frame), QueryLimits()).session()
+
+
+def test_filter_mask_selects_rows(session):
+    mask = session.filter_mask("SELECT * FROM tips WHERE day = 'Sun' AND total_bill > 15")
+    assert mask.tolist() == [False, False, True, False]
+
+
+def test_filter_mask_needs_every_column(session):
+    with pytest.raises(SqlError) as error:
+        session.filter_mask("SELECT day FROM tips")
+    assert error.value.code == "invalid"
+
+
+def test_row_ids_are_hidden(session):
+    assert ROW_ID not in session.query("SELECT * FROM tips").columns
+    with pytest.raises(SqlError):
+        session.query(f'SELECT "{ROW_ID}" FROM tips')
+    with pytest.raises(SqlError):
+        session.query("SELECT * FROM tips_rows")
+    with pytest.raises(SqlError):
+        session.filter_mask("SELECT * FROM TIPS_ROWS")